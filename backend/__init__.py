@@ -17,6 +17,16 @@ module_bp = modules.module.Module('netopeer', __name__, url_prefix = '/netopeer'
 from .schemas import *
 from .devices import *
 from .connections import *
+from .notifications import notifications_subscribe, notifications_unsubscribe, notifications_list
+from .polling import watch_add, watch_rm
+from .fleet import fleet_commit, fleet_query
+from .metrics import metrics_get, metrics_request_start, metrics_request_end
+from .transfer import transfer_response
+
+module_bp.before_request(metrics_request_start)
+module_bp.after_request(metrics_request_end)
+# the after_request hooks run in the reverse order, compress before the request is measured
+module_bp.after_request(transfer_response)
 
 module_bp.add_url_rule('/inventory/schemas', view_func = schemas_list, methods = ['GET'])
 module_bp.add_url_rule('/inventory/schemas', view_func = schemas_add, methods=['POST'])
@@ -26,12 +36,24 @@ module_bp.add_url_rule('/inventory/devices/list', view_func = devices_list, meth
 module_bp.add_url_rule('/inventory/devices', view_func = devices_add, methods=['POST'])
 module_bp.add_url_rule('/inventory/devices', view_func = devices_rm, methods = ['DELETE'])
 module_bp.add_url_rule('/session', view_func = connect, methods=['POST'])
+module_bp.add_url_rule('/session/bulk', view_func = connect_bulk, methods=['POST'])
 module_bp.add_url_rule('/session', view_func = session_close, methods = ['DELETE'])
+module_bp.add_url_rule('/admin/sessions', view_func = sessions_admin_list, methods = ['GET'])
+module_bp.add_url_rule('/admin/sessions', view_func = sessions_admin_reap, methods = ['DELETE'])
 module_bp.add_url_rule('/session/alive', view_func = session_alive, methods=['GET'])
 module_bp.add_url_rule('/session/capabilities', view_func = session_get_capabilities, methods=['GET'])
 module_bp.add_url_rule('/session/rpcGet', view_func = session_get, methods=['GET'])
 module_bp.add_url_rule('/session/commit', view_func = session_commit, methods = ['POST'])
+module_bp.add_url_rule('/fleet/commit', view_func = fleet_commit, methods = ['POST'])
+module_bp.add_url_rule('/fleet/query', view_func = fleet_query, methods = ['POST'])
 module_bp.add_url_rule('/session/element/checkvalue', view_func = data_checkvalue, methods = ['GET'])
 module_bp.add_url_rule('/session/schema', view_func = schema_info, methods = ['GET'])
 module_bp.add_url_rule('/session/schema/checkvalue', view_func = schema_checkvalue, methods = ['GET'])
+module_bp.add_url_rule('/session/checkvalues', view_func = checkvalues, methods = ['POST'])
 module_bp.add_url_rule('/session/schema/values', view_func = schema_values, methods = ['GET'])
+module_bp.add_url_rule('/session/notifications', view_func = notifications_list, methods = ['GET'])
+module_bp.add_url_rule('/session/notifications', view_func = notifications_subscribe, methods = ['POST'])
+module_bp.add_url_rule('/session/notifications', view_func = notifications_unsubscribe, methods = ['DELETE'])
+module_bp.add_url_rule('/session/watch', view_func = watch_add, methods = ['POST'])
+module_bp.add_url_rule('/session/watch', view_func = watch_rm, methods = ['DELETE'])
+module_bp.add_url_rule('/metrics', view_func = metrics_get, methods = ['GET'])
@@ -7,23 +7,275 @@ Author: Radek Krejci <rkrejci@cesnet.cz>
 import json
 import os
 import logging
-
-from liberouterapi import socketio, auth
-from flask import request
-from eventlet.timeout import Timeout
+import time
+from collections import OrderedDict
+
+from liberouterapi import socketio, auth, config
+from liberouterapi.role import Role
+from flask import request, Response
+from eventlet import tpool
+from eventlet.greenpool import GreenPool
+from eventlet.greenthread import getcurrent
+import eventlet
 import yang
 import netconf2 as nc
 
 from .inventory import INVENTORY
-from .socketio import sio_emit, sio_wait, sio_clean
-from .devices import devices_get, devices_replace
+from .socketio import sio_request
+from .devices import devices_get, devices_replace, devices_all
 from .error import NetopeerException
 from .schemas import getschema, schemas_update
+from .contexts import context_acquire, context_release, context_cache
+from .metrics import metrics_timer, metrics_iter, metrics_count, metrics_collector
+from .transfer import etag_make, etag_response
 from .data import *
 
 log = logging.getLogger(__name__)
 
+# lifetime (in seconds) of the datastore snapshot cached for each session
+DATA_CACHE_TTL = float(config['netopeer'].get('data_cache_ttl', '30'))
+# maximum number of devices being connected at once by the bulk connect
+CONNECT_POOL_SIZE = int(config['netopeer'].get('connect_pool_size', '16'))
+
+# idle time (in seconds) after which the session is closed, 0 to keep idle sessions
+SESSION_IDLE_TIMEOUT = float(config['netopeer'].get('session_idle_timeout', '1800'))
+# maximum number of sessions per user and in total
+SESSIONS_USER_MAX = int(config['netopeer'].get('sessions_user_max', '32'))
+SESSIONS_MAX = int(config['netopeer'].get('sessions_max', '256'))
+# maximum size (in bytes of the XML representation) of the cached data per user and in total
+DATA_BYTES_USER_MAX = int(config['netopeer'].get('data_bytes_user_max', '67108864'))
+DATA_BYTES_MAX = int(config['netopeer'].get('data_bytes_max', '268435456'))
+# period (in seconds) of checking the limits above
+REAPER_INTERVAL = float(config['netopeer'].get('reaper_interval', '60'))
+
 sessions = {}
+__reaper = None
+# whether the bindings' rpcGetConfig accepts the with-defaults mode
+__getconfig_defaults = True
+# the connects in progress, the key is the (green) thread building the NETCONF session
+__connecting = {}
+
+
+def _session_drop(username, key):
+	# the session may be already closed (e.g. by the reaper while an RPC was in progress)
+	sess = sessions.get(username, {}).pop(key, None)
+	if sess:
+		context_release(sess['context'])
+
+
+def _session_touch(sess):
+	sess['used'] = time.time()
+
+
+def _session_bytes(sess):
+	return sum(sess.get('bytes', {}).values())
+
+
+def _session_data_drop(sess):
+	# release the cached data, they will be retrieved from the device again when needed
+	sess.pop('data', None)
+	sess['data-timestamp'] = 0
+	sess['subtrees'] = {}
+	sess['bytes'] = {}
+
+
+def _data_retrieved(sess, data):
+	# version (derived from the content, the same data get the same version) and size of the retrieved data
+	xml = data.print_mem(yang.LYD_XML, yang.LYP_WITHSIBLINGS) if data else ''
+	metrics_count('netopeer_data_bytes_total', 'Size of the data retrieved from the devices.',
+	              len(xml), {'device': sess.get('device')})
+	return etag_make(xml), len(xml)
+
+
+def _sessions_lru(username = None):
+	# the (username, key) pairs from the least recently used session
+	result = []
+	for user in sessions:
+		if username and user != username:
+			continue
+		for key in sessions[user]:
+			result.append((sessions[user][key].get('used', 0), user, key))
+	result.sort()
+	return [(user, key) for _, user, key in result]
+
+
+def _sessions_full(username):
+	# the error message if the user cannot open another session, None otherwise
+	if len(sessions.get(username, {})) >= SESSIONS_USER_MAX:
+		return 'Too many open sessions (' + str(SESSIONS_USER_MAX) + '), close some of them first.'
+	if sum([len(sessions[user]) for user in sessions]) >= SESSIONS_MAX:
+		return 'Too many open sessions of all the users (' + str(SESSIONS_MAX) + ').'
+	return None
+
+
+def _sessions_reap():
+	# close idle sessions and keep the numbers of sessions and sizes of the cached data in the limits,
+	# the least recently used sessions are evicted first
+	now = time.time()
+	reaped = {'closed': [], 'released': []}
+
+	if SESSION_IDLE_TIMEOUT:
+		for user, key in _sessions_lru():
+			if now - sessions[user][key].get('used', 0) < SESSION_IDLE_TIMEOUT:
+				break
+			_session_drop(user, key)
+			reaped['closed'].append({'user': user, 'key': key})
+
+	for user in sessions:
+		lru = _sessions_lru(user)
+		while len(lru) > SESSIONS_USER_MAX:
+			_session_drop(*lru[0])
+			reaped['closed'].append({'user': user, 'key': lru.pop(0)[1]})
+	lru = _sessions_lru()
+	while len(lru) > SESSIONS_MAX:
+		_session_drop(*lru[0])
+		user, key = lru.pop(0)
+		reaped['closed'].append({'user': user, 'key': key})
+
+	def release(lru, limit):
+		size = sum([_session_bytes(sessions[user][key]) for user, key in lru])
+		for user, key in lru:
+			if size <= limit:
+				break
+			if _session_bytes(sessions[user][key]):
+				size -= _session_bytes(sessions[user][key])
+				_session_data_drop(sessions[user][key])
+				reaped['released'].append({'user': user, 'key': key})
+
+	for user in sessions:
+		release(_sessions_lru(user), DATA_BYTES_USER_MAX)
+	release(_sessions_lru(), DATA_BYTES_MAX)
+
+	if reaped['closed'] or reaped['released']:
+		log.info('Reaped %d sessions and data of %d sessions', len(reaped['closed']), len(reaped['released']))
+	return reaped
+
+
+@metrics_collector
+def _sessions_metrics():
+	count = []
+	size = []
+	for user in sessions:
+		count.append(({'user': user}, len(sessions[user])))
+		for key in sessions[user]:
+			size.append(({'user': user, 'session': key, 'device': sessions[user][key].get('device')},
+			             _session_bytes(sessions[user][key])))
+	return [('netopeer_sessions', 'Number of the open NETCONF sessions.', count),
+	        ('netopeer_session_data_bytes', 'Size of the data cached for the NETCONF sessions.', size)]
+
+
+def _sessions_reaper():
+	while True:
+		eventlet.sleep(REAPER_INTERVAL)
+		try:
+			_sessions_reap()
+		except Exception as e:
+			log.error('Reaping sessions failed: ' + str(e))
+
+
+def _sessions_reaper_start():
+	global __reaper
+	if not __reaper:
+		__reaper = eventlet.spawn(_sessions_reaper)
+
+
+def _session_filter(sess, path):
+	# prefer XPath filter when supported by the device, subtree filter otherwise. None (no filter) if
+	# the path cannot be expressed as subtree filter (e.g. positional predicates), the complete data
+	# are retrieved then and the path is searched locally.
+	for cpblt in sess['session'].capabilities:
+		if cpblt.startswith('urn:ietf:params:netconf:capability:xpath:1.0'):
+			return path
+	try:
+		return dataPathFilter(sess['session'].context, path)
+	except ValueError as e:
+		log.debug('Getting complete data instead of ' + path + ': ' + str(e))
+		return None
+
+
+def _session_datastore(name):
+	# NETCONF datastore for <get-config>, None for an unknown name
+	return {'running': nc.DATASTORE_RUNNING, 'startup': nc.DATASTORE_STARTUP,
+	        'candidate': nc.DATASTORE_CANDIDATE}.get(name)
+
+
+def _session_defaults(sess):
+	# with-defaults mode (RFC 6243) omitting the default values, if supported by the device and the bindings
+	for cpblt in sess['session'].capabilities:
+		if cpblt.startswith('urn:ietf:params:netconf:capability:with-defaults:1.0'):
+			if 'trim' in cpblt and hasattr(nc, 'WD_TRIM'):
+				return nc.WD_TRIM
+			if hasattr(nc, 'WD_EXPLICIT'):
+				return nc.WD_EXPLICIT
+	return None
+
+
+def _session_config(sess, datastore, path):
+	# only the configuration, without the state data and (if possible) without the default values
+	global __getconfig_defaults
+	filter = _session_filter(sess, path) if path else None
+	defaults = _session_defaults(sess) if __getconfig_defaults else None
+	if defaults is not None:
+		try:
+			return sess['session'].rpcGetConfig(_session_datastore(datastore), filter, defaults)
+		except TypeError as e:
+			# the bindings do not accept the with-defaults mode, do not try it anymore
+			log.info('Getting configuration without with-defaults: ' + str(e))
+			__getconfig_defaults = False
+	return sess['session'].rpcGetConfig(_session_datastore(datastore), filter)
+
+
+def _session_data(sess, refresh = False, path = None, datastore = None):
+	# get the datastore snapshot of the session, the device is asked (via <get>)
+	# only if there is no valid cached snapshot or the refresh is explicitly requested.
+	# If the path is specified, only the subtree is requested from the device, but
+	# the complete snapshot is used when still valid. With the datastore specified,
+	# its configuration is requested (via <get-config>) and cached separately.
+	return _session_snapshot(sess, refresh, path, datastore)[0]
+
+
+def _session_snapshot(sess, refresh = False, path = None, datastore = None):
+	# the same as _session_data(), but provides also the version of the snapshot (digest of its content)
+	now = time.time()
+	if not 'subtrees' in sess:
+		sess['subtrees'] = {}
+	cached = (datastore, path) if datastore else path
+	if not refresh:
+		if not datastore and 'data' in sess and now - sess['data-timestamp'] < DATA_CACHE_TTL:
+			return sess['data'], sess['data-version']
+		if cached in sess['subtrees'] and now - sess['subtrees'][cached][0] < DATA_CACHE_TTL:
+			return sess['subtrees'][cached][1], sess['subtrees'][cached][2]
+
+	if not path and not datastore:
+		with metrics_timer('rpc-get'):
+			sess['data'] = sess['session'].rpcGet()
+		sess['data-timestamp'] = now
+		sess['subtrees'] = {}
+		sess['data-version'], size = _data_retrieved(sess, sess['data'])
+		sess['bytes'] = {None: size}
+		return sess['data'], sess['data-version']
+
+	if datastore:
+		with metrics_timer('rpc-get-config'):
+			data = _session_config(sess, datastore, path)
+	else:
+		with metrics_timer('rpc-get-filtered'):
+			data = sess['session'].rpcGet(_session_filter(sess, path))
+	# forget the expired subtrees
+	for expired in [p for p in sess['subtrees'] if now - sess['subtrees'][p][0] >= DATA_CACHE_TTL]:
+		del sess['subtrees'][expired]
+		sess['bytes'].pop(expired, None)
+	version, size = _data_retrieved(sess, data)
+	sess['subtrees'][cached] = (now, data, version)
+	sess.setdefault('bytes', {})[cached] = size
+	return data, version
+
+
+def _session_data_invalidate(sess):
+	# keep the data for the value checks, but force the next _session_data() to get them again
+	sess['data-timestamp'] = 0
+	sess['subtrees'] = {}
+	sess['bytes'] = {None: sess['bytes'][None]} if None in sess.get('bytes', {}) else {}
 
 def hostkey_check(hostname, state, keytype, hexa, priv):
 	if 'fingerprint' in priv['device']:
@@ -34,86 +286,105 @@ def hostkey_check(hostname, state, keytype, hexa, priv):
 			log.error("Incorrect host key state")
 			state = 2
 
+	connecting = __connecting.get(getcurrent())
+	if connecting and not connecting['interactive']:
+		# the user cannot be asked from the native thread, the device is connected again interactively
+		connecting['interaction'] = True
+		return False
+
 	# ask frontend/user for hostkey check
-	params = {'id': priv['session']['session_id'], 'hostname' : hostname, 'state' : state, 'keytype' : keytype, 'hexa' : hexa}
-	sio_emit('hostcheck', params)
+	params = {'session': priv['session']['session_id'], 'hostname' : hostname, 'state' : state, 'keytype' : keytype, 'hexa' : hexa}
+	data = sio_request('hostcheck', params, 30)
 
 	result = False
-	timeout = Timeout(30)
-	try:
-		# wait for response from the frontend
-		data = sio_wait(priv['session']['session_id'])
-		result = data['result']
-	except Timeout:
+	if data is None:
 		# no response received within the timeout
 		log.info("socketio: hostcheck timeout.")
-	except KeyError:
-		# invalid response
-		log.error("socketio: invalid hostcheck_result received.")
-	finally:
-		# we have the response
-		sio_clean(priv['session']['session_id'])
-		timeout.cancel()
+	else:
+		try:
+			result = data['result']
+		except KeyError:
+			# invalid response
+			log.error("socketio: invalid hostcheck_result received.")
 
 	if result:
 		# store confirmed fingerprint for future connections
 		priv['device']['fingerprint'] = hexa;
 		devices_replace(priv['device']['id'], priv['session']['user'].username, priv['device'])
 
+	_connect_resume()
 	return result
 
 
-def auth_common(session_id):
+def auth_common(session_id, params):
 	result = None
-	timeout = Timeout(60)
-	try:
-		# wait for response from the frontend
-		data = sio_wait(session_id)
-		result = data['password']
-	except Timeout:
+	data = sio_request('device_auth', dict(params, session = session_id), 60)
+	if data is None:
 		# no response received within the timeout
 		log.info("socketio: auth request timeout.")
-	except KeyError:
-		# no password
-		log.info("socketio: invalid credential data received.")
-	finally:
-		# we have the response
-		sio_clean(session_id)
-		timeout.cancel()
+	else:
+		try:
+			result = data['password']
+		except KeyError:
+			# no password
+			log.info("socketio: invalid credential data received.")
 
+	_connect_resume()
 	return result
 
 
 def auth_password(username, hostname, priv):
-	sio_emit('device_auth', {'id': priv, 'type': 'Password Authentication', 'msg': username + '@' + hostname})
-	return auth_common(priv)
+	return auth_common(priv, {'type': 'Password Authentication', 'msg': username + '@' + hostname})
 
 
 def auth_interactive(name, instruction, prompt, priv):
-	sio_emit('device_auth', {'id': priv, 'type': name, 'msg': instruction, 'prompt': prompt})
-	return auth_common(priv)
+	return auth_common(priv, {'type': name, 'msg': instruction, 'prompt': prompt})
+
+
+def _connect_resume():
+	# The schema search path and callback of libnetconf2 are global (for the native thread), so other
+	# connects may have changed them while this one was waiting for the user. Set them for this connect
+	# again before returning to the handshake.
+	connecting = __connecting.get(getcurrent())
+	if connecting:
+		nc.setSearchpath(connecting['path'])
+		nc.setSchemaCallback(_connect_getschema, None)
+
+
+def _connect_getschema(name, revision, submod_name, submod_revision, priv):
+	# the schema callback of all the connects, the missing schema is asked from the user building the session
+	connecting = __connecting[getcurrent()]
+	if not connecting['interactive']:
+		# the user cannot be asked from the native thread, the device is connected again interactively
+		connecting['interaction'] = True
+		return (None, None)
+	result = getschema(name, revision, submod_name, submod_revision, connecting['session'])
+	_connect_resume()
+	return result
 
-@auth.required()
-def connect():
-	session = auth.lookup(request.headers.get('lgui-Authorization', None))
-	user = session['user']
-	path = os.path.join(INVENTORY, user.username)
 
-	data = request.get_json()
-	if 'id' in data:
-		# stored device
-		device = devices_get(data['id'], user.username)
-	elif 'device' in data:
-		# one-time connect, the device is specified in request
-		device = data['device']
-	else:
-		raise NetopeerException('Invalid connection request.')
+def _connect_session(session, device, ssh, interactive = True):
+	# create the NETCONF session with the schema search path and callback of the connecting user.
+	# Without interactive, None is returned when the user would have to be asked for something.
+	connecting = __connecting[getcurrent()] = {'session': session, 'path': os.path.join(INVENTORY, session['user'].username),
+	                                           'interactive': interactive, 'interaction': False}
+	try:
+		_connect_resume()
+		ncs = nc.Session(device['hostname'], device['port'], ssh)
+	except Exception:
+		if connecting['interaction']:
+			return None
+		raise
+	finally:
+		del __connecting[getcurrent()]
+	if connecting['interaction']:
+		# the session is incomplete (e.g. without a missing schema), it is closed by releasing it
+		return None
+	return ncs
 
-	if not device:
-		raise NetopeerException('Unknown device to connect to request.')
 
-	nc.setSearchpath(path)
-	nc.setSchemaCallback(getschema, session)
+def _connect(session, device):
+	user = session['user']
 
 	if 'password' in device:
 		ssh = nc.SSH(device['username'], password = device['password'])
@@ -123,13 +394,27 @@ def connect():
 		ssh.setAuthInteractiveClb(auth_interactive, session['session_id'])
 
 	ssh.setAuthHostkeyCheckClb(hostkey_check, {'session': session, 'device' : device})
+	# the open sessions are never closed to make room for a new one, the connect is refused instead
+	error = _sessions_full(user.username)
+	if error:
+		return {'success': False, 'error-msg': error}
 	try:
-		ncs = nc.Session(device['hostname'], device['port'], ssh)
+		with metrics_timer('connect'):
+			ncs = None
+			if 'password' in device and 'fingerprint' in device:
+				# nothing to ask the user, so the blocking handshake runs in a native thread and other
+				# devices are connected meanwhile
+				ncs = tpool.execute(_connect_session, session, device, ssh, False)
+			if not ncs:
+				ncs = _connect_session(session, device, ssh)
 	except Exception as e:
-		nc.setSchemaCallback(None)
-		return(json.dumps({'success': False, 'error-msg': str(e)}))
-	nc.setSchemaCallback(None)
+		return {'success': False, 'error-msg': str(e)}
 
+	error = _sessions_full(user.username)
+	if error:
+		# other sessions were created (e.g. by the bulk connect) while connecting this one,
+		# the new session is closed by releasing it
+		return {'success': False, 'error-msg': error}
 	if not user.username in sessions:
 		sessions[user.username] = {}
 
@@ -137,11 +422,81 @@ def connect():
 	key = ncs.host + ":" + str(ncs.port) + ":" + ncs.id
 	sessions[user.username][key] = {}
 	sessions[user.username][key]['session'] = ncs
+	sessions[user.username][key]['device'] = device.get('id')
+	# share the information derived from the schemas with the sessions to the devices with the same modules
+	sessions[user.username][key]['context'] = context_acquire(ncs.context, ncs.capabilities)
+	sessions[user.username][key]['schema-cache'] = context_cache(sessions[user.username][key]['context'])
+	_session_touch(sessions[user.username][key])
+
+	_sessions_reaper_start()
+
+	return {'success': True, 'session-key': key}
+
+
+@auth.required()
+def connect():
+	session = auth.lookup(request.headers.get('lgui-Authorization', None))
+	user = session['user']
+
+	data = request.get_json()
+	if 'id' in data:
+		# stored device
+		device = devices_get(data['id'], user.username)
+	elif 'device' in data:
+		# one-time connect, the device is specified in request
+		device = data['device']
+	else:
+		raise NetopeerException('Invalid connection request.')
 
-	# update inventory's list of schemas
-	schemas_update(session)
+	if not device:
+		raise NetopeerException('Unknown device to connect to request.')
 
-	return(json.dumps({'success': True, 'session-key': key}))
+	result = _connect(session, device)
+
+	if result['success']:
+		# update inventory's list of schemas
+		with metrics_timer('schemas-update'):
+			schemas_update(session)
+
+	return(json.dumps(result))
+
+
+@auth.required()
+def connect_bulk():
+	session = auth.lookup(request.headers.get('lgui-Authorization', None))
+	user = session['user']
+
+	data = request.get_json(silent = True) or {}
+	if 'ids' in data:
+		devices = []
+		for device_id in data['ids']:
+			device = devices_get(device_id, user.username)
+			if not device:
+				raise NetopeerException('Unknown device ' + str(device_id) + ' to connect to request.')
+			devices.append(device)
+	else:
+		# all the devices to be connected automatically
+		devices = [device for device in devices_all(user.username) if device.get('autoconnect')]
+
+	def connect_device(device):
+		# the progress is reported only to the Socket.IO clients of the connecting login session
+		socketio.emit('connect_progress', {'session': session['session_id'], 'device': device['id'], 'state': 'connecting'},
+		              room = session['session_id'])
+		result = _connect(session, device)
+		result['device'] = device['id']
+		socketio.emit('connect_progress', {'session': session['session_id'], 'device': device['id'],
+		                                   'state': 'connected' if result['success'] else 'failed', 'result': result},
+		              room = session['session_id'])
+		return result
+
+	results = list(GreenPool(CONNECT_POOL_SIZE).imap(connect_device, devices))
+
+	if [result for result in results if result['success']]:
+		# update inventory's list of schemas
+		with metrics_timer('schemas-update'):
+			schemas_update(session)
+
+	return(json.dumps({'success': True, 'sessions': results}))
 
 
 @auth.required()
@@ -159,6 +514,7 @@ def session_get_capabilities():
 	key = req['key']
 	if not key in sessions[user.username]:
 		return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
+	_session_touch(sessions[user.username][key])
 
 	cpblts = []
 	for c in sessions[user.username][key]['session'].capabilities:
@@ -183,12 +539,31 @@ def session_get():
 	key = req['key']
 	if not key in sessions[user.username]:
 		return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
+	_session_touch(sessions[user.username][key])
+
+	# optional window of the serialized list instances
+	window = None
+	if 'limit' in req:
+		try:
+			window = {'offset': int(req.get('offset', 0)), 'limit': int(req['limit']), 'list': req.get('list')}
+		except ValueError:
+			return(json.dumps({'success': False, 'error-msg': 'Invalid offset or limit.'}))
+		if window['offset'] < 0 or window['limit'] < 1:
+			return(json.dumps({'success': False, 'error-msg': 'Invalid offset or limit.'}))
+
+	# optional datastore to get only its configuration
+	datastore = req.get('datastore')
+	if datastore and _session_datastore(datastore) is None:
+		return(json.dumps({'success': False, 'error-msg': 'Invalid datastore.'}))
 
 	try:
-		sessions[user.username][key]['data'] = sessions[user.username][key]['session'].rpcGet()
+		data, version = _session_snapshot(sessions[user.username][key], True if req.get('refresh') == 'true' else False,
+		                                 req.get('path'), datastore)
+	except ValueError as e:
+		return(json.dumps({'success': False, 'error-msg': str(e)}))
 	except ConnectionError as e:
 		reply = {'success': False, 'error': [{'msg': str(e)}]}
-		del sessions[user.username][key]
+		_session_drop(user.username, key)
 		return(json.dumps(reply))
 	except nc.ReplyError as e:
 		reply = {'success': False, 'error': []}
@@ -196,10 +571,22 @@ def session_get():
 			reply['error'].append(json.loads(str(err)))
 		return(json.dumps(reply))
 
+	# the same snapshot serialized with the same parameters (refresh does not change the result)
+	etag = etag_make(version, *sorted([(k, v) for k, v in req.items() if k != 'refresh']))
+	not_modified = etag_response(etag)
+	if not_modified:
+		return not_modified
+
+	cache = sessions[user.username][key]['schema-cache']
+	# the compact format refers to the schema information instead of repeating it in each node
+	compact = req.get('format') == 'compact'
 	if not 'path' in req:
-		return(dataInfoRoots(sessions[user.username][key]['data'], True if req['recursive'] == 'true' else False))
+		result = dataInfoRoots(data, True if req['recursive'] == 'true' else False, cache, window, compact)
 	else:
-		return(dataInfoSubtree(sessions[user.username][key]['data'], req['path'], True if req['recursive'] == 'true' else False))
+		result = dataInfoSubtree(data, req['path'], True if req['recursive'] == 'true' else False, cache, window, compact)
+	response = Response(metrics_iter(result, 'serialize'), mimetype = 'application/json')
+	response.set_etag(etag)
+	return response
 
 
 def _checkvalue(session, req, schema):
@@ -215,11 +602,17 @@ def _checkvalue(session, req, schema):
 	key = req['key']
 	if not key in sessions[user.username]:
 		return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
+	_session_touch(sessions[user.username][key])
 
 	ctx = sessions[user.username][key]['session'].context;
 	if schema:
 		search = ctx.find_path(req['path'])
 	else:
+		if not sessions[user.username][key].get('data'):
+			# the cached data were released, get them again
+			error = _checkvalue_data(user.username, key)
+			if error:
+				return(json.dumps(error))
 		search = sessions[user.username][key]['data'].find_path(req['path'])
 
 	if search.number() != 1:
@@ -230,14 +623,38 @@ def _checkvalue(session, req, schema):
 	else:
 		node = search.data()[0]
 
-	if node.validate_value(req['value']):
+	error = _checkvalue_node(ctx, node, req['value'])
+	if error:
+		return(json.dumps({'success': False, 'error-msg': error}))
+
+	return(json.dumps({'success': True}))
+
+
+def _checkvalue_data(username, key):
+	# get the session's data again, the error reply (the same as of session_get) if it fails
+	try:
+		_session_data(sessions[username][key])
+	except ConnectionError as e:
+		_session_drop(username, key)
+		return {'success': False, 'error': [{'msg': str(e)}]}
+	except nc.ReplyError as e:
+		reply = {'success': False, 'error': []}
+		for err in e.args[0]:
+			reply['error'].append(json.loads(str(err)))
+		return reply
+	return None
+
+
+def _checkvalue_node(ctx, node, value):
+	# returns error message in case the value is not valid for the (schema or data) node
+	if node.validate_value(value):
 		errors = yang.get_ly_errors(ctx)
 		if errors.size():
-			return(json.dumps({'success': False, 'error-msg': errors[errors.size() - 1].errmsg()}))
+			return errors[errors.size() - 1].errmsg()
 		else:
-			return(json.dumps({'success': False, 'error-msg': 'unknown error'}))
+			return 'unknown error'
+	return None
 
-	return(json.dumps({'success': True}))
 
 @auth.required()
 def data_checkvalue():
@@ -255,6 +672,73 @@ def schema_checkvalue():
 	return _checkvalue(session, req, True)
 
 
+@auth.required()
+def checkvalues():
+	session = auth.lookup(request.headers.get('lgui-Authorization', None))
+	user = session['user']
+	req = request.get_json(silent = True) or {}
+
+	if not 'key' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing session key.'}))
+	if not isinstance(req.get('items'), list):
+		return(json.dumps({'success': False, 'error-msg': 'Missing items to validate.'}))
+
+	key = req['key']
+	if not key in sessions[user.username]:
+		return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
+	_session_touch(sessions[user.username][key])
+
+	sess = sessions[user.username][key]
+	ctx = sess['session'].context
+	# each path is searched only once, even if there are more values to check for it
+	nodes = {}
+	result = []
+	for item in req['items']:
+		if not isinstance(item, dict) or not 'path' in item:
+			result.append({'success': False, 'error-msg': 'Missing path to validate value.'})
+			continue
+		if not 'value' in item:
+			result.append({'success': False, 'error-msg': 'Missing value to validate.'})
+			continue
+		if not isinstance(item['value'], str):
+			# values are checked in their canonical (string) form, JSON booleans and numbers would be misrepresented
+			result.append({'success': False, 'error-msg': 'The value to validate must be a string.'})
+			continue
+
+		schema = item.get('schema', True)
+		lookup = (bool(schema), item['path'])
+		if not lookup in nodes:
+			if schema:
+				search = ctx.find_path(item['path'])
+			else:
+				if not sess.get('data'):
+					# the cached data were released, get them again
+					error = _checkvalue_data(user.username, key)
+					if error:
+						return(json.dumps(error))
+				search = sess['data'].find_path(item['path']) if sess['data'] else None
+
+			if not search or search.number() != 1:
+				nodes[lookup] = None
+			elif schema:
+				nodes[lookup] = search.schema()[0]
+			else:
+				nodes[lookup] = search.data()[0]
+
+		node = nodes[lookup]
+		if not node:
+			result.append({'success': False, 'error-msg': 'Invalid data path.'})
+			continue
+
+		error = _checkvalue_node(ctx, node, item['value'])
+		if error:
+			result.append({'success': False, 'error-msg': error})
+		else:
+			result.append({'success': True})
+
+	return(json.dumps({'success': True, 'data': result}))
+
+
 @auth.required()
 def schema_values():
 	session = auth.lookup(request.headers.get('lgui-Authorization', None))
@@ -269,6 +753,7 @@ def schema_values():
 	key = req['key']
 	if not key in sessions[user.username]:
 		return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
+	_session_touch(sessions[user.username][key])
 
 	search = sessions[user.username][key]['session'].context.find_path(req['path'])
 	if search.number() != 1:
@@ -278,7 +763,7 @@ def schema_values():
 	if schema.nodetype() != yang.LYS_LEAF and schema.nodetype != yang.LYS_LEAFLIST:
 		result = None
 	else:
-		result = typeValues(schema.subtype().type(), [])
+		result = schemaValuesCached(schema, sessions[user.username][key]['schema-cache'])
 	return(json.dumps({'success': True, 'data': result}))
 
 
@@ -296,6 +781,7 @@ def schema_info():
 	key = req['key']
 	if not key in sessions[user.username]:
 		return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
+	_session_touch(sessions[user.username][key])
 
 	if req['path'] == '/':
 		node = None
@@ -305,33 +791,19 @@ def schema_info():
 			return(json.dumps({'success': False, 'error-msg': 'Invalid data path.'}))
 		node = search.schema()[0]
 
-	result = [];
+	sess = sessions[user.username][key]
 	if 'relative' in req:
 		if req['relative'] == 'children':
-			if node:
-				instantiables = node.child_instantiables(0)
-			else:
-				# top level
-				instantiables = sessions[user.username][key]['session'].context.data_instantiables(0)
+			parent = node
 		elif req['relative'] == 'siblings':
-			if node.parent():
-				instantiables = node.parent().child_instantiables(0)
-			else:
-				# top level
-				instantiables = sessions[user.username][key]['session'].context.data_instantiables(0)
+			# None for the top level
+			parent = node.parent() if node else None
 		else:
 			return(json.dumps({'success': False, 'error-msg': 'Invalid relative parameter.'}))
 
-		for child in instantiables:
-			if child.flags() & yang.LYS_CONFIG_R:
-				# ignore status nodes
-				continue
-			if child.nodetype() & (yang.LYS_RPC | yang.LYS_NOTIF | yang.LYS_ACTION):
-				# ignore RPCs, Notifications and Actions
-				continue
-			result.append(schemaInfoNode(child))
+		result = schemaChildrenCached(sess['session'].context, parent, sess['schema-cache'])
 	else:
-		result.append(schemaInfoNode(node))
+		result = [schemaInfoCached(node, sess['schema-cache'])]
 
 	return(json.dumps({'success': True, 'data': result}))
 
@@ -359,19 +831,20 @@ def _create_child(ctx, parent, child_def):
 				_create_child(ctx, child, grandchild)
 
 
-@auth.required()
-def session_commit():
-	session = auth.lookup(request.headers.get('lgui-Authorization', None))
-	user = session['user']
+def _commit_prune(mods):
+	# drop the modifications without any effect - changes inside the deleted subtrees. The changes setting
+	# the current content again are kept, the cached snapshot may not reflect changes by other managers.
+	deleted = [key for key in mods if mods[key]['type'] == 'delete']
+	result = OrderedDict()
+	for key in mods:
+		if [path for path in deleted if key.startswith(path + '/')]:
+			continue
+		result[key] = mods[key]
+	return result
 
-	req = request.get_json(keep_order = True)
-	if not 'key' in req:
-		return(json.dumps({'success': False, 'error-msg': 'Missing session key.'}))
-	if not 'modifications' in req:
-		return(json.dumps({'success': False, 'error-msg': 'Missing modifications.'}))
 
-	mods = req['modifications']
-	ctx = sessions[user.username][req['key']]['session'].context
+def _commit_build(ctx, mods):
+	# build the edit-config content from the modifications received from the frontend
 	root = None
 	reorders = []
 	for key in mods:
@@ -419,7 +892,7 @@ def session_commit():
 		elif mods[key]['type'] == 'replace':
 			node.insert_attr(None, 'ietf-netconf:operation', 'replace')
 		else:
-			return(json.dumps({'success': False, 'error-msg': 'Invalid modification ' + key}))
+			raise ValueError('Invalid modification ' + key)
 
 		if recursion and 'children' in mods[key]['data']:
 			for child in mods[key]['data']['children']:
@@ -451,16 +924,51 @@ def session_commit():
 			elif 'value' in move:
 				node.insert_attr(None, 'yang:value', move['value'])
 
+	return root
+
+
+def _commit_send(sess, root):
 	# print(root.print_mem(yang.LYD_XML, yang.LYP_FORMAT))
 	try:
-		sessions[user.username][req['key']]['session'].rpcEditConfig(nc.DATASTORE_RUNNING, root)
+		with metrics_timer('edit-config'):
+			sess['session'].rpcEditConfig(nc.DATASTORE_RUNNING, root)
 	except nc.ReplyError as e:
 		reply = {'success': False, 'error': []}
 		for err in e.args[0]:
 			reply['error'].append(json.loads(str(err)))
-		return(json.dumps(reply))
+		return reply
 
-	return(json.dumps({'success': True}))
+	# the device's data were changed, do not serve them from the cache anymore
+	_session_data_invalidate(sess)
+	return {'success': True}
+
+
+@auth.required()
+def session_commit():
+	session = auth.lookup(request.headers.get('lgui-Authorization', None))
+	user = session['user']
+
+	req = request.get_json(keep_order = True)
+	if not 'key' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing session key.'}))
+	if not 'modifications' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing modifications.'}))
+
+	if not req['key'] in sessions[user.username]:
+		return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
+	sess = sessions[user.username][req['key']]
+	_session_touch(sess)
+	mods = _commit_prune(req['modifications'])
+	if not mods:
+		# nothing to change on the device
+		return(json.dumps({'success': True}))
+
+	try:
+		root = _commit_build(sess['session'].context, mods)
+	except ValueError as e:
+		return(json.dumps({'success': False, 'error-msg': str(e)}))
+
+	return(json.dumps(_commit_send(sess, root)))
 
 
 @auth.required()
@@ -479,7 +987,7 @@ def session_close():
 	if not key in sessions[user.username]:
 		return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
 
-	del sessions[user.username][key]
+	_session_drop(user.username, key)
 	return(json.dumps({'success': True}))
 
 @auth.required()
@@ -497,5 +1005,34 @@ def session_alive():
 	key = req['key']
 	if not key in sessions[user.username]:
 		return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
+	_session_touch(sessions[user.username][key])
 
 	return(json.dumps({'success': True}))
+
+
+@auth.required(Role.admin)
+def sessions_admin_list():
+	now = time.time()
+	result = []
+	for user, key in reversed(_sessions_lru()):
+		sess = sessions[user][key]
+		result.append({'user': user, 'key': key, 'device': sess.get('device'),
+		               'idle': now - sess.get('used', 0), 'data-bytes': _session_bytes(sess)})
+	limits = {'idle-timeout': SESSION_IDLE_TIMEOUT, 'sessions-user-max': SESSIONS_USER_MAX, 'sessions-max': SESSIONS_MAX,
+	          'data-bytes-user-max': DATA_BYTES_USER_MAX, 'data-bytes-max': DATA_BYTES_MAX}
+	return(json.dumps({'success': True, 'sessions': result, 'limits': limits}))
+
+
+@auth.required(Role.admin)
+def sessions_admin_reap():
+	req = request.get_json(silent = True) or {}
+
+	if 'user' in req and 'key' in req:
+		# evict the specific session
+		if not req['user'] in sessions or not req['key'] in sessions[req['user']]:
+			return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
+		_session_drop(req['user'], req['key'])
+		return(json.dumps({'success': True, 'closed': [{'user': req['user'], 'key': req['key']}], 'released': []}))
+
+	reaped = _sessions_reap()
+	return(json.dumps({'success': True, 'closed': reaped['closed'], 'released': reaped['released']}))
@@ -0,0 +1,97 @@
+"""
+Cache of the information derived from the libyang contexts of NETCONF sessions
+File: contexts.py
+
+Sessions with the same schema context (the same modules with the same revisions,
+features and deviations) share the entry, unused entries are evicted as LRU.
+The sessions whose context cannot be completely identified get private entries.
+"""
+
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from liberouterapi import config
+
+from .data import schemaInfoCache
+
+# maximum number of the kept entries not used by any session
+CONTEXTS_UNUSED_MAX = int(config['netopeer'].get('contexts_unused_max', '16'))
+
+contexts = {}
+__unused = OrderedDict()
+
+
+def context_key(ctx, capabilities):
+	# make a key from the modules of the session's libyang context, None if the context cannot be identified.
+	# The features and deviations are known only from the capabilities of the modules announced in the hello
+	# message, the YANG 1.1 modules listed only in the YANG library may have any features enabled.
+	announced = {}
+	items = []
+	library = False
+	for cpblt in capabilities:
+		if '?' not in cpblt:
+			# NETCONF capabilities, they enable the features of ietf-netconf
+			items.append(cpblt)
+			continue
+		uri, query = cpblt.split('?', 1)
+		params = parse_qs(query)
+		if 'module' in params:
+			announced[params['module'][0]] = '|'.join([
+			        ','.join(sorted(','.join(params.get('features', [])).split(','))),
+			        ','.join(sorted(','.join(params.get('deviations', [])).split(',')))])
+		elif uri.startswith('urn:ietf:params:netconf:capability:yang-library:'):
+			library = True
+
+	for module in ctx.get_module_iter():
+		name = module.name() + '@' + (module.rev().date() if module.rev_size() else '')
+		if not module.implemented():
+			items.append(name)
+		elif module.name() in announced:
+			items.append(name + '|implemented|' + announced[module.name()])
+		elif library:
+			# implemented module with unknown features
+			return None
+		else:
+			# libyang's and libnetconf2's internal modules
+			items.append(name + '|implemented')
+	items.sort()
+	return hashlib.sha1('\n'.join(items).encode()).hexdigest()
+
+
+def context_acquire(ctx, capabilities):
+	key = context_key(ctx, capabilities)
+	if key is None:
+		# do not share the information with other sessions
+		key = 'private-' + uuid.uuid4().hex
+	if key in __unused:
+		del __unused[key]
+	if not key in contexts:
+		contexts[key] = {'refs': 0, 'cache': schemaInfoCache()}
+	contexts[key]['refs'] += 1
+	contexts[key]['used'] = time.time()
+	return key
+
+
+def context_release(key):
+	if not key in contexts:
+		return
+	contexts[key]['refs'] -= 1
+	contexts[key]['used'] = time.time()
+	if contexts[key]['refs'] > 0:
+		return
+	if key.startswith('private-'):
+		del contexts[key]
+		return
+
+	# keep the entry for the future sessions, but limit the number of such entries
+	__unused[key] = True
+	while len(__unused) > CONTEXTS_UNUSED_MAX:
+		evicted, _ = __unused.popitem(last = False)
+		del contexts[evicted]
+
+
+def context_cache(key):
+	return contexts[key]['cache']
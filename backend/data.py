@@ -6,6 +6,8 @@ Author: Radek Krejci <rkrejci@cesnet.cz>
 
 import json
 import os
+import re
+from xml.sax.saxutils import escape, quoteattr
 
 import yang
 import netconf2 as nc
@@ -102,112 +104,402 @@ def schemaInfoNode(schema):
 	return info
 
 
+def schemaInfoCache():
+	# cache of the information about the schema nodes of a single context
+	return {'info': {}, 'values': {}, 'children': {}}
+
+
+def schemaInfoCached(schema, cache=None):
+	# the information is shared by all the data nodes instantiating the schema node, so they must not modify it
+	if cache is None:
+		return schemaInfoNode(schema)
+
+	path = schema.path()
+	try:
+		return cache['info'][path]
+	except KeyError:
+		info = cache['info'][path] = schemaInfoNode(schema)
+		return info
+
+
+def schemaValuesCached(schema, cache=None):
+	if cache is None:
+		return typeValues(schema.subtype().type(), [])
+
+	path = schema.path()
+	try:
+		return cache['values'][path]
+	except KeyError:
+		values = cache['values'][path] = typeValues(schema.subtype().type(), [])
+		return values
+
+
+def schemaChildrenCached(ctx, schema, cache=None):
+	# information about the configuration nodes which can be instantiated as children of the schema node
+	# (top-level nodes for None), the index is filled lazily for each parent node
+	path = schema.path() if schema else '/'
+	if cache is not None and path in cache['children']:
+		return cache['children'][path]
+
+	if schema:
+		instantiables = schema.child_instantiables(0)
+	else:
+		instantiables = ctx.data_instantiables(0)
+
+	result = []
+	for child in instantiables:
+		if child.flags() & yang.LYS_CONFIG_R:
+			# ignore status nodes
+			continue
+		if child.nodetype() & (yang.LYS_RPC | yang.LYS_NOTIF | yang.LYS_ACTION):
+			# ignore RPCs, Notifications and Actions
+			continue
+		result.append(schemaInfoCached(child, cache))
+
+	if cache is not None:
+		cache['children'][path] = result
+	return result
+
+
+__predicateName = re.compile(r'^(\.|[A-Za-z_][\w.-]*(:[A-Za-z_][\w.-]*)?)$')
+
+
+def _pathSegments(path):
+	# split data path into the list of (module, name, [(key, value), ...]), module is None when
+	# the node is from the same module as its parent
+	segments = []
+	index = 0
+	while index < len(path):
+		if path[index] != '/':
+			raise ValueError('Invalid data path ' + path)
+		index += 1
+		start = index
+		while index < len(path) and path[index] not in '/[':
+			index += 1
+		qname = path[start:index]
+		colon = qname.find(':')
+		predicates = []
+		while index < len(path) and path[index] == '[':
+			# only the key (or leaf-list value) predicates name=<quoted value>, the name must be
+			# within the predicate (its value may contain any character, including ']')
+			eq = path.find('=', index)
+			close = path.find(']', index)
+			if eq == -1 or close < eq:
+				raise ValueError('Invalid predicate in data path ' + path)
+			key = path[index + 1:eq].strip()
+			if not __predicateName.match(key):
+				raise ValueError('Invalid predicate in data path ' + path)
+			key = key[key.find(':') + 1:]
+			quote = path[eq + 1]
+			end = path.find(quote, eq + 2)
+			if quote not in '\'"' or end == -1 or path[end + 1:end + 2] != ']':
+				raise ValueError('Invalid predicate in data path ' + path)
+			predicates.append((key, path[eq + 2:end]))
+			index = end + 2
+		if colon == -1:
+			segments.append((None, qname, predicates))
+		else:
+			segments.append((qname[:colon], qname[colon + 1:], predicates))
+	return segments
+
+
+def dataPathFilter(ctx, path):
+	# convert data path into the NETCONF subtree filter selecting the node and its subtree
+	head = ''
+	tail = ''
+	segments = _pathSegments(path)
+	for index, (module, name, predicates) in enumerate(segments):
+		if module:
+			mod = ctx.get_module(module)
+			if not mod:
+				raise ValueError('Unknown module ' + module + ' in data path ' + path)
+			head = head + '<' + name + ' xmlns=' + quoteattr(mod.ns()) + '>'
+		elif not index:
+			raise ValueError('Missing module name in data path ' + path)
+		else:
+			head = head + '<' + name + '>'
+		for key, value in predicates:
+			if key == '.':
+				# leaf-list instance
+				head = head + escape(value)
+			else:
+				head = head + '<' + key + '>' + escape(value) + '</' + key + '>'
+		tail = '</' + name + '>' + tail
+	return head + tail
+
+
 def _sortChildren(node):
-	sorted = []
-	for index, item in enumerate(node["children"]):
-		sorted.append(item)
-		if item["info"]["type"] == yang.LYS_LIST:
-			removed = 0
-			if "ordered" in item["info"]:
-				item["order"] = removed
-			for i, instance in enumerate(node["children"][index + 1:]):
-				if item["info"]["name"] == instance["info"]["name"] and item["info"]["module"] == instance["info"]["module"]:
-					sorted.append(node["children"].pop(index + 1 + i - removed))
-					removed += 1;
-					if "ordered" in item["info"]:
-						instance["order"] = removed
-		if item["info"]["type"] == yang.LYS_LEAFLIST:
-			lastLeafList = len(sorted) - 1
-			item["first"] = True
-			removed = 0
-			if "ordered" in item["info"]:
-				item["order"] = removed
-			for i, instance in enumerate(node["children"][index + 1:]):
-				if item["info"]["name"] == instance["info"]["name"] and item["info"]["module"] == instance["info"]["module"]:
-					instance["first"] = False
-					sorted.append(node["children"].pop(index + 1 + i - removed))
-					removed += 1;
-					if "ordered" in item["info"]:
-						instance["order"] = removed
-	node["children"] = sorted
-	last = node["children"][len(node["children"]) - 1]
+	# group instances of lists and leaf-lists, the groups keep the position of their first instance
+	groups = []
+	instances = {}
+	for item in node["children"]:
+		if item["info"]["type"] & (yang.LYS_LIST | yang.LYS_LEAFLIST):
+			key = (item["info"]["module"], item["info"]["name"])
+			if key in instances:
+				instances[key].append(item)
+				continue
+			instances[key] = [item]
+			groups.append(instances[key])
+		else:
+			groups.append([item])
+
+	result = []
+	for group in groups:
+		info = group[0]["info"]
+		if info["type"] == yang.LYS_LEAFLIST:
+			lastLeafList = len(result)
+			for instance in group:
+				instance["first"] = False
+			group[0]["first"] = True
+		if info["type"] & (yang.LYS_LIST | yang.LYS_LEAFLIST) and "ordered" in info:
+			for index, instance in enumerate(group):
+				instance["order"] = index
+		result.extend(group)
+
+	node["children"] = result
+	if not result:
+		return
+	last = result[len(result) - 1]
 	if last["info"]["type"] == yang.LYS_LEAFLIST:
-		node["children"][lastLeafList]["last"] = True
-		for item in node["children"][lastLeafList + 1:]:
+		result[lastLeafList]["last"] = True
+		for item in result[lastLeafList + 1:]:
 			item["lastLeafList"] = True;
 	else:
 		last["last"] = True
 
 
-def dataInfoNode(node, parent=None, recursion=False):
-	schema = node.schema()
-	casted = node.subtype()
+def _dataInfoKeys(node, schema):
+	# keys are always the first children of the list instance
+	result = []
+	child = node.child()
+	for key in schema.subtype().keys():
+		if not child:
+			break
+		if key.name() == child.schema().name():
+			result.append(child.subtype().value_str())
+		child = child.next()
+	return result
 
+
+def _dataInfoHead(node, recursion=False, cache=None):
+	# information about the node without its children
 	if node.dflt():
 		return None
 
-	info = schemaInfoNode(schema);
+	schema = node.schema()
+	info = schemaInfoCached(schema, cache);
 
 	result = {}
 	if info["type"] == yang.LYS_LEAF or info["type"] == yang.LYS_LEAFLIST:
+		casted = node.subtype()
 		result["value"] = casted.value_str()
 		if info["datatypebase"] == "identityref":
+			# the value-specific information, do not modify the shared info
+			info = dict(info)
 			info["refmodule"] = make_schema_key(casted.value().ident().module())
-	elif recursion:
-		result["children"] = []
-		if node.child():
-			for child in node.child().tree_for():
-				childNode = dataInfoNode(child, result, True)
-				if not childNode:
-					continue
-				result["children"].append(childNode)
-			# sort list instances
-			_sortChildren(result)
-		if info["type"] == yang.LYS_LIST:
-			result["keys"] = []
-			index = 0
-			for key in schema.subtype().keys():
-				if len(result["children"]) <= index:
-					break
-				if key.subtype().name() == result["children"][index]["info"]["name"]:
-					result["keys"].append(result["children"][index]["value"])
-				index = index + 1
+	elif recursion and info["type"] == yang.LYS_LIST:
+		result["keys"] = _dataInfoKeys(node, schema)
 	result["info"] = info
 	result["path"] = node.path()
 
 	return result
 
-def dataInfoSubtree(data, path, recursion=False):
-	try:
-		node = data.find_path(path).data()[0]
-	except:
-		return(json.dumps({'success': False, 'error-msg': 'Invalid data path.'}))
 
-	result = dataInfoNode(node)
-	if not result:
-		return(json.dumps({'success': False, 'error-msg': 'Path refers to a default node.'}))
+def dataInfoNode(node, parent=None, recursion=False, cache=None):
+	result = _dataInfoHead(node, recursion, cache)
+	if not result or not recursion or result["info"]["type"] & (yang.LYS_LEAF | yang.LYS_LEAFLIST):
+		return result
 
 	result["children"] = []
 	if node.child():
 		for child in node.child().tree_for():
-			childNode = dataInfoNode(child, result, recursion)
+			childNode = dataInfoNode(child, result, True, cache)
 			if not childNode:
 				continue
 			result["children"].append(childNode)
+		# sort list instances
 		_sortChildren(result)
 
-	return(json.dumps({'success': True, 'data': result}))
+	return result
 
 
-def dataInfoRoots(data, recursion=False):
-	top = {}
-	top["children"] = []
-	for root in data.tree_for():
-		rootNode = dataInfoNode(root, top, recursion)
-		if not rootNode:
-			continue
-		if not recursion:
-			rootNode['subtreeRoot'] = True
-		top["children"].append(rootNode)
-	_sortChildren(top)
-	return(json.dumps({'success': True, 'data': top["children"]}))
+def _dataInfoSiblings(first, recursion=False, cache=None, window=None):
+	# information about the siblings (without their children) in the order expected by frontend,
+	# each item is accompanied by the data node to be able to continue with its children.
+	# The window (dict with offset, limit and optional list schema path) limits the serialized
+	# instances of the lists, the number of all the instances is provided as total in the first
+	# serialized instance.
+	level = {"children": []}
+	nodes = {}
+	counts = {}
+	if first:
+		for sibling in first.tree_for():
+			if window:
+				info = schemaInfoCached(sibling.schema(), cache)
+				if window['list'] and info["path"] != window['list']:
+					continue
+				if info["type"] == yang.LYS_LIST:
+					key = (info["module"], info["name"])
+					index = counts[key] = counts.get(key, 0) + 1
+					if index <= window['offset'] or index > window['offset'] + window['limit']:
+						continue
+			head = _dataInfoHead(sibling, recursion, cache)
+			if not head:
+				continue
+			level["children"].append(head)
+			nodes[id(head)] = sibling
+		_sortChildren(level)
+
+	if counts:
+		group = None
+		for head in level["children"]:
+			if head["info"]["type"] != yang.LYS_LIST:
+				continue
+			key = (head["info"]["module"], head["info"]["name"])
+			if key != group:
+				group = key
+				head["offset"] = window['offset']
+				head["total"] = counts[key]
+			if "order" in head:
+				head["order"] += window['offset']
+
+	return [(head, nodes[id(head)]) for head in level["children"]]
+
+
+def _windowNested(window):
+	# the offset and the list selection apply only to the requested level of the tree
+	if not window:
+		return None
+	return {'offset': 0, 'limit': window['limit'], 'list': None}
+
+
+def schemaTable():
+	# table of the schema information referred by the nodes in the compact format
+	return {"ids": {}, "infos": []}
+
+
+def _dataInfoDump(head, table=None):
+	# in the compact format, the schema information is replaced by its index in the table
+	if table is None:
+		return json.dumps(head)
+
+	info = head["info"]
+	key = (info["path"], info.get("refmodule"))
+	index = table["ids"].get(key)
+	if index is None:
+		index = table["ids"][key] = len(table["infos"])
+		table["infos"].append(info)
+	compact = dict(head)
+	compact["info"] = index
+	return json.dumps(compact)
+
+
+def _dataInfoStream(head, node, recursion=False, cache=None, window=None, table=None):
+	if not recursion or head["info"]["type"] & (yang.LYS_LEAF | yang.LYS_LEAFLIST):
+		yield _dataInfoDump(head, table)
+		return
+
+	# the head is never empty, so just replace its closing bracket by the children
+	yield _dataInfoDump(head, table)[:-1] + ', "children": ['
+	yield from _dataInfoStreamSiblings(node.child(), True, False, cache, window, table)
+	yield ']}'
+
+
+def _dataInfoStreamSiblings(first, recursion=False, roots=False, cache=None, window=None, table=None):
+	separator = ''
+	for head, node in _dataInfoSiblings(first, recursion, cache, window):
+		if roots and not recursion:
+			head['subtreeRoot'] = True
+		yield separator
+		yield from _dataInfoStream(head, node, recursion, cache, _windowNested(window), table)
+		separator = ', '
+
+
+def _streamBuffered(chunks, size=65536):
+	# join the small chunks of the serialized data to avoid sending tiny pieces of data
+	buffer = []
+	length = 0
+	for chunk in chunks:
+		buffer.append(chunk)
+		length += len(chunk)
+		if length >= size:
+			yield ''.join(buffer)
+			buffer = []
+			length = 0
+	if buffer:
+		yield ''.join(buffer)
+
+
+# The following functions serialize the data tree into JSON continuously as a generator
+# of the JSON pieces to be sent via streamed response, so only the currently processed
+# branch of the data tree is being kept in memory. In the compact format, the nodes refer
+# to the schema information by the index to the "schemas" list following the data.
+
+def dataInfoSubtree(data, path, recursion=False, cache=None, window=None, compact=False):
+	try:
+		node = data.find_path(path).data()[0]
+	except:
+		return [json.dumps({'success': False, 'error-msg': 'Invalid data path.'})]
+
+	head = _dataInfoHead(node, False, cache)
+	if not head:
+		return [json.dumps({'success': False, 'error-msg': 'Path refers to a default node.'})]
+
+	table = schemaTable() if compact else None
+
+	def stream():
+		yield '{"success": true, "data": ' + _dataInfoDump(head, table)[:-1] + ', "children": ['
+		yield from _dataInfoStreamSiblings(node.child(), recursion, False, cache, window, table)
+		if table is None:
+			yield ']}}'
+		else:
+			yield ']}, "schemas": ' + json.dumps(table["infos"]) + '}'
+
+	return _streamBuffered(stream())
+
+
+def dataInfoRoots(data, recursion=False, cache=None, window=None, compact=False):
+	table = schemaTable() if compact else None
+
+	def stream():
+		yield '{"success": true, "data": ['
+		yield from _dataInfoStreamSiblings(data, recursion, True, cache, window, table)
+		if table is None:
+			yield ']}'
+		else:
+			yield '], "schemas": ' + json.dumps(table["infos"]) + '}'
+
+	return _streamBuffered(stream())
+
+
+def dataInfoMatches(data, path, recursion=False, cache=None, compact=False):
+	# the same as dataInfoSubtree(), but the data are the list of all the nodes matching the XPath
+	try:
+		nodes = data.find_path(path).data() if data else []
+	except:
+		return [json.dumps({'success': False, 'error-msg': 'Invalid data path.'})]
+
+	table = schemaTable() if compact else None
+
+	def stream():
+		yield '{"success": true, "data": ['
+		separator = ''
+		for node in nodes:
+			head = _dataInfoHead(node, False, cache)
+			if not head:
+				# default node
+				continue
+			yield separator
+			separator = ', '
+			if head["info"]["type"] & (yang.LYS_LEAF | yang.LYS_LEAFLIST):
+				yield _dataInfoDump(head, table)
+				continue
+			yield _dataInfoDump(head, table)[:-1] + ', "children": ['
+			yield from _dataInfoStreamSiblings(node.child(), recursion, False, cache, None, table)
+			yield ']}'
+		if table is None:
+			yield ']}'
+		else:
+			yield '], "schemas": ' + json.dumps(table["infos"]) + '}'
+
+	return _streamBuffered(stream())
@@ -7,6 +7,7 @@ Author: Radek Krejci <rkrejci@cesnet.cz>
 import json
 import os
 import errno
+import tempfile
 
 from liberouterapi import auth
 from flask import request
@@ -16,12 +17,28 @@ from .error import NetopeerException
 
 __DEVICES_EMPTY = '{"device":[]}'
 
+# parsed devices inventories of the users, the files are parsed again only when modified
+__devices_cache = {}
+
 
 def __devices_init():
 	return json.loads(__DEVICES_EMPTY)
 
+def __devices_inv_stat(devicesinv_path):
+	try:
+		stat = os.stat(devicesinv_path)
+	except OSError as e:
+		if e.errno == errno.ENOENT:
+			return None
+		raise NetopeerException('Unable to use user\'s devices inventory ' + devicesinv_path + ' (' + str(e) + ').')
+	return (stat.st_mtime_ns, stat.st_size)
+
 def __devices_inv_load(path):
 	devicesinv_path = os.path.join(path, 'devices.json')
+	stat = __devices_inv_stat(devicesinv_path)
+	if path in __devices_cache and __devices_cache[path]['stat'] == stat:
+		return __devices_cache[path]
+
 	try:
 		with open(devicesinv_path, 'r') as devices_file:
 			devices = json.load(devices_file)
@@ -33,19 +50,38 @@ def __devices_inv_load(path):
 	except ValueError:
 		devices = __devices_init()
 
-	return devices
+	# index the devices by their id
+	__devices_cache[path] = {'stat': stat, 'devices': devices, 'index': {}}
+	for dev in devices['device']:
+		__devices_cache[path]['index'][dev['id']] = dev
+
+	return __devices_cache[path]
 
-def __devices_inv_save(path, devices):
+def __devices_inv_save(path, inventory):
 	devicesinv_path = os.path.join(path, 'devices.json')
 
-	#store the list
-	try:
-		with open(devicesinv_path, 'w') as devices_file:
-			json.dump(devices, devices_file)
-	except Exception:
-		pass
+	inventory_check(path)
 
-	return devices
+	#store the list into a temporary file and replace the inventory by it atomically
+	tmp_path = None
+	try:
+		fd, tmp_path = tempfile.mkstemp(prefix = '.devices.json.', dir = path)
+		with os.fdopen(fd, 'w') as devices_file:
+			json.dump(inventory['devices'], devices_file)
+		os.replace(tmp_path, devicesinv_path)
+	except (OSError, ValueError) as e:
+		if tmp_path:
+			try:
+				os.remove(tmp_path)
+			except OSError:
+				pass
+		# the cached inventory may differ from the file now
+		__devices_cache.pop(path, None)
+		raise NetopeerException('Unable to store user\'s devices inventory ' + devicesinv_path + ' (' + str(e) + ').')
+
+	inventory['stat'] = __devices_inv_stat(devicesinv_path)
+
+	return inventory
 
 @auth.required()
 def devices_list():
@@ -54,13 +90,14 @@ def devices_list():
 	path = os.path.join(INVENTORY, user.username)
 
 	inventory_check(path)
-	devices = __devices_inv_load(path)
+	inventory = __devices_inv_load(path)
 
-	for dev in devices['device']:
-		if 'password' in dev:
-			del dev['password']
+	# do not modify the cached devices
+	devices = []
+	for dev in inventory['devices']['device']:
+		devices.append({key: dev[key] for key in dev if key != 'password'})
 
-	return(json.dumps(devices['device']))
+	return(json.dumps(devices))
 
 @auth.required()
 def devices_add():
@@ -72,10 +109,9 @@ def devices_add():
 	if not device or not device['id']:
 		raise NetopeerException('Invalid device remove request.')
 
-	devices = __devices_inv_load(path)
-	for dev in devices['device']:
-		if dev['id'] == device['id']:
-			return (json.dumps({'success': False}))
+	inventory = __devices_inv_load(path)
+	if device['id'] in inventory['index']:
+		return (json.dumps({'success': False}))
 
 	device_json = {'id':device['id'],
 		'name':device['name'],
@@ -85,10 +121,11 @@ def devices_add():
 		'username':device['username']}
 	if 'password' in device and device['password']:
 		device_json['password'] = device['password']
-	devices['device'].append(device_json)
+	inventory['devices']['device'].append(device_json)
+	inventory['index'][device_json['id']] = device_json
 
 	#store the list
-	__devices_inv_save(path, devices)
+	__devices_inv_save(path, inventory)
 
 	return(json.dumps({'success': True}))
 
@@ -102,43 +139,44 @@ def devices_rm():
 	if not rm_id:
 		raise NetopeerException('Invalid device remove request.')
 
-	devices = __devices_inv_load(path)
-	for i in range(len(devices['device'])):
-		device = devices['device'][i]
-		if device['id'] == rm_id:
-			devices['device'].pop(i)
-			device = None
-			break
-
-	if device:
+	inventory = __devices_inv_load(path)
+	device = inventory['index'].pop(rm_id, None)
+	if not device:
 		# device not in inventory
 		return (json.dumps({'success': False}))
+	inventory['devices']['device'].remove(device)
 
 	# update the inventory database
-	__devices_inv_save(path, devices)
+	__devices_inv_save(path, inventory)
 
 	return(json.dumps({'success': True}))
 
 def devices_get(device_id, username):
 	path = os.path.join(INVENTORY, username)
-	devices = __devices_inv_load(path)
+	inventory = __devices_inv_load(path)
 
-	for i in range(len(devices['device'])):
-		device = devices['device'][i]
-		if device['id'] == device_id:
-			return device
+	if device_id in inventory['index']:
+		# the caller is allowed to modify the device
+		return dict(inventory['index'][device_id])
 
 	return None
 
 
+def devices_all(username):
+	path = os.path.join(INVENTORY, username)
+	return [dict(device) for device in __devices_inv_load(path)['devices']['device']]
+
+
 def devices_replace(device_id, username, device):
 	path = os.path.join(INVENTORY, username)
-	devices = __devices_inv_load(path)
+	inventory = __devices_inv_load(path)
 
-	for i in range(len(devices['device'])):
-		if devices['device'][i]['id'] == device_id:
-			devices['device'][i] = device
-			break
+	if device_id in inventory['index']:
+		device = dict(device)
+		devices = inventory['devices']['device']
+		devices[devices.index(inventory['index'][device_id])] = device
+		del inventory['index'][device_id]
+		inventory['index'][device['id']] = device
 
 	# update the inventory database
-	__devices_inv_save(path, devices)
+	__devices_inv_save(path, inventory)
@@ -0,0 +1,193 @@
+"""
+Operations on many NETCONF sessions at once
+File: fleet.py
+
+The targets are given by the session keys or by the inventory ids of the
+connected devices. The devices are processed concurrently (in a bounded pool
+of green threads) and the per-device results are streamed back as newline
+delimited JSON in the order of their arrival. The bindings do blocking I/O
+without yielding to the eventlet hub, so the RPCs run in the native threads
+of eventlet's tpool.
+"""
+
+import json
+import logging
+
+import eventlet
+from eventlet import Timeout, tpool
+from eventlet.greenpool import GreenPool
+from eventlet.queue import Queue
+from flask import request, Response
+from liberouterapi import auth, config
+import netconf2 as nc
+
+from .connections import sessions, _session_touch, _session_drop, _session_data, _commit_prune, _commit_build, _commit_send
+from .data import dataInfoMatches
+
+log = logging.getLogger(__name__)
+
+# maximum number of devices being processed concurrently by a fleet operation
+FLEET_POOL_SIZE = int(config['netopeer'].get('fleet_pool_size', '16'))
+# default time limit (in seconds) of getting the data from a single device by the fleet query
+FLEET_QUERY_TIMEOUT = float(config['netopeer'].get('fleet_query_timeout', '30'))
+
+
+def _fleet_targets(username, req):
+	# the sessions addressed by their keys or by the inventory ids of the connected devices
+	user_sessions = sessions.get(username, {})
+	targets = []
+	seen = set()
+	for key in req.get('keys', []):
+		if not key in user_sessions:
+			targets.append({'key': key, 'error-msg': 'Invalid session key.'})
+		elif not key in seen:
+			seen.add(key)
+			targets.append({'key': key, 'device': user_sessions[key].get('device')})
+	for device_id in req.get('ids', []):
+		keys = [key for key in user_sessions if user_sessions[key].get('device') == device_id]
+		if not keys:
+			targets.append({'device': device_id, 'error-msg': 'The device is not connected.'})
+			continue
+		# the most recently used session to the device
+		key = max(keys, key = lambda k: user_sessions[k].get('used', 0))
+		if not key in seen:
+			seen.add(key)
+			targets.append({'key': key, 'device': device_id})
+	return targets
+
+
+def _fleet_stream(username, targets, func, stop_on_error = False):
+	# run func(username, target) for all the targets in the pool, the results are yielded as they arrive
+	results = Queue()
+	state = {'stopped': False}
+
+	def run(target):
+		result = {'key': target.get('key'), 'device': target.get('device'), 'success': False}
+		try:
+			if 'error-msg' in target:
+				result.update({'success': False, 'error-msg': target['error-msg']})
+			elif state['stopped']:
+				result.update({'success': False, 'skipped': True, 'error-msg': 'Skipped after a failure on another device.'})
+			else:
+				try:
+					result.update(func(username, target))
+				except ConnectionError as e:
+					result.update({'success': False, 'error': [{'msg': str(e)}]})
+					_session_drop(username, target['key'])
+				except Exception as e:
+					log.error('Fleet operation on session ' + target['key'] + ' failed: ' + str(e))
+					result.update({'success': False, 'error-msg': str(e)})
+		finally:
+			# the stream waits for the result of each target
+			if stop_on_error and not result['success']:
+				state['stopped'] = True
+			results.put(result)
+
+	def dispatch():
+		# spawning waits for a free green thread, so do not block the streaming
+		pool = GreenPool(FLEET_POOL_SIZE)
+		for target in targets:
+			pool.spawn_n(run, target)
+
+	def stream():
+		eventlet.spawn_n(dispatch)
+		summary = {'done': True, 'succeeded': 0, 'failed': 0, 'skipped': 0}
+		for _ in targets:
+			result = results.get()
+			if result.get('skipped'):
+				summary['skipped'] += 1
+			elif result['success']:
+				summary['succeeded'] += 1
+			else:
+				summary['failed'] += 1
+			if 'serialized' in result:
+				# the device's part of the reply was already serialized, just add the target
+				serialized = result.pop('serialized')
+				yield json.dumps({'key': result['key'], 'device': result['device']})[:-1] + ', ' + serialized[1:] + '\n'
+			else:
+				yield json.dumps(result) + '\n'
+		yield json.dumps(summary) + '\n'
+
+	return Response(stream(), mimetype = 'application/x-ndjson')
+
+
+@auth.required()
+def fleet_commit():
+	session = auth.lookup(request.headers.get('lgui-Authorization', None))
+	user = session['user']
+
+	req = request.get_json(keep_order = True, silent = True) or {}
+	if not 'keys' in req and not 'ids' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing session keys or device ids.'}))
+	if not 'modifications' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing modifications.'}))
+
+	targets = _fleet_targets(user.username, req)
+	mods = _commit_prune(req['modifications'])
+
+	# the edit is built once for each schema context, the sessions sharing the context get the same tree
+	trees = {}
+	for target in targets:
+		if 'error-msg' in target:
+			continue
+		sess = sessions[user.username][target['key']]
+		_session_touch(sess)
+		if sess['context'] in trees or not mods:
+			continue
+		try:
+			trees[sess['context']] = _commit_build(sess['session'].context, mods)
+		except Exception as e:
+			trees[sess['context']] = e
+
+	def commit(username, target):
+		sess = sessions[username][target['key']]
+		if not mods:
+			# nothing to change on the device
+			return {'success': True}
+		if isinstance(trees[sess['context']], Exception):
+			return {'success': False, 'error-msg': str(trees[sess['context']])}
+		return tpool.execute(_commit_send, sess, trees[sess['context']])
+
+	return _fleet_stream(user.username, targets, commit, req.get('stop-on-error') is True)
+
+
+@auth.required()
+def fleet_query():
+	session = auth.lookup(request.headers.get('lgui-Authorization', None))
+	user = session['user']
+
+	req = request.get_json(silent = True) or {}
+	if not 'keys' in req and not 'ids' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing session keys or device ids.'}))
+	if not 'path' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing XPath to query.'}))
+	try:
+		timeout = float(req.get('timeout', FLEET_QUERY_TIMEOUT))
+	except (TypeError, ValueError):
+		return(json.dumps({'success': False, 'error-msg': 'Invalid timeout.'}))
+
+	targets = _fleet_targets(user.username, req)
+	for target in targets:
+		if not 'error-msg' in target:
+			_session_touch(sessions[user.username][target['key']])
+
+	def query(username, target):
+		sess = sessions[username][target['key']]
+		# one slow device must not hold the others, its result is just reported as failed. The RPC
+		# itself cannot be interrupted, it finishes in its thread and the data are just cached.
+		try:
+			with Timeout(timeout):
+				data = tpool.execute(_session_data, sess, req.get('refresh') is True, req['path'])
+		except Timeout:
+			return {'success': False, 'error-msg': 'The device did not reply in ' + str(timeout) + ' seconds.'}
+		except nc.ReplyError as e:
+			reply = {'success': False, 'error': []}
+			for err in e.args[0]:
+				reply['error'].append(json.loads(str(err)))
+			return reply
+
+		serialized = ''.join(dataInfoMatches(data, req['path'], req.get('recursive') is True, sess['schema-cache'],
+		                                     req.get('format') == 'compact'))
+		return {'success': serialized.startswith('{"success": true'), 'serialized': serialized}
+
+	return _fleet_stream(user.username, targets, query)
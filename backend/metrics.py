@@ -0,0 +1,154 @@
+"""
+Performance metrics of the Netopeer2 GUI backend
+File: metrics.py
+
+Latencies of the routes and the processing stages are kept as histograms,
+sizes as counters, and everything is served in the Prometheus text format.
+"""
+
+import time
+from contextlib import contextmanager
+
+from flask import request, g, Response
+from liberouterapi import auth, config
+from liberouterapi.role import Role
+
+# upper bounds (in seconds) of the latency histograms buckets
+METRICS_BUCKETS = [float(b) for b in config['netopeer'].get('metrics_buckets',
+                   '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30').split(',')]
+# serve the metrics without authentication (for the scrapers without the GUI's token)
+METRICS_PUBLIC = config['netopeer'].get('metrics_public', 'false').lower() in ['true', 'yes', '1']
+
+# name: {'help', 'type', 'values': {labels: value or histogram}}
+__metrics = {}
+# functions providing the current values of gauges, each returns a list of (name, help, [(labels, value)])
+__collectors = []
+
+
+def _labels(labels):
+	return tuple(sorted(labels.items())) if labels else ()
+
+
+def _metric(name, help, type):
+	if not name in __metrics:
+		__metrics[name] = {'help': help, 'type': type, 'values': {}}
+	return __metrics[name]['values']
+
+
+def metrics_count(name, help, value = 1, labels = None):
+	values = _metric(name, help, 'counter')
+	key = _labels(labels)
+	values[key] = values.get(key, 0) + value
+
+
+def metrics_observe(name, help, value, labels = None):
+	values = _metric(name, help, 'histogram')
+	key = _labels(labels)
+	if not key in values:
+		values[key] = {'buckets': [0] * len(METRICS_BUCKETS), 'sum': 0, 'count': 0}
+	histogram = values[key]
+	for i, bound in enumerate(METRICS_BUCKETS):
+		if value <= bound:
+			histogram['buckets'][i] += 1
+	histogram['sum'] += value
+	histogram['count'] += 1
+
+
+def metrics_stage(stage, value):
+	metrics_observe('netopeer_stage_seconds', 'Duration of the request processing stages.', value, {'stage': stage})
+
+
+@contextmanager
+def metrics_timer(stage):
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		metrics_stage(stage, time.perf_counter() - start)
+
+
+def metrics_iter(chunks, stage):
+	# measure the time spent in producing (not sending) the streamed response and its size
+	elapsed = 0
+	size = 0
+	iterator = iter(chunks)
+	while True:
+		start = time.perf_counter()
+		try:
+			chunk = next(iterator)
+		except StopIteration:
+			break
+		finally:
+			elapsed += time.perf_counter() - start
+		size += len(chunk)
+		yield chunk
+	metrics_stage(stage, elapsed)
+	metrics_count('netopeer_stage_bytes_total', 'Size of the data produced by the request processing stages.',
+	              size, {'stage': stage})
+
+
+def metrics_collector(collector):
+	__collectors.append(collector)
+	return collector
+
+
+def metrics_request_start():
+	g.metrics_start = time.perf_counter()
+
+
+def metrics_request_end(response):
+	if not hasattr(g, 'metrics_start'):
+		return response
+
+	route = request.url_rule.rule if request.url_rule else 'unknown'
+	labels = {'route': route, 'method': request.method}
+	metrics_observe('netopeer_request_seconds', 'Latency of the requests (until the response body starts).',
+	                time.perf_counter() - g.metrics_start, labels)
+	labels['status'] = str(response.status_code)
+	metrics_count('netopeer_requests_total', 'Number of the processed requests.', 1, labels)
+	if not response.is_streamed and response.content_length:
+		metrics_count('netopeer_response_bytes_total', 'Size of the (not streamed) responses.',
+		              response.content_length, {'route': route})
+	return response
+
+
+def _format_labels(labels, extra = None):
+	items = list(labels) + ([extra] if extra else [])
+	if not items:
+		return ''
+	return '{' + ','.join(['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+	                       for name, value in items]) + '}'
+
+
+def metrics_text():
+	lines = []
+	for name in sorted(__metrics):
+		metric = __metrics[name]
+		lines.append('# HELP %s %s' % (name, metric['help']))
+		lines.append('# TYPE %s %s' % (name, metric['type']))
+		for labels, value in metric['values'].items():
+			if metric['type'] != 'histogram':
+				lines.append('%s%s %s' % (name, _format_labels(labels), repr(value)))
+				continue
+			for bound, count in zip(METRICS_BUCKETS, value['buckets']):
+				lines.append('%s_bucket%s %d' % (name, _format_labels(labels, ('le', repr(bound))), count))
+			lines.append('%s_bucket%s %d' % (name, _format_labels(labels, ('le', '+Inf')), value['count']))
+			lines.append('%s_sum%s %s' % (name, _format_labels(labels), repr(value['sum'])))
+			lines.append('%s_count%s %d' % (name, _format_labels(labels), value['count']))
+
+	for collector in __collectors:
+		for name, help, values in collector():
+			lines.append('# HELP %s %s' % (name, help))
+			lines.append('# TYPE %s gauge' % name)
+			for labels, value in values:
+				lines.append('%s%s %s' % (name, _format_labels(_labels(labels)), repr(value)))
+
+	return '\n'.join(lines) + '\n'
+
+
+def metrics_get():
+	return Response(metrics_text(), mimetype = 'text/plain; version=0.0.4')
+
+
+if not METRICS_PUBLIC:
+	metrics_get = auth.required(Role.admin)(metrics_get)
@@ -0,0 +1,182 @@
+"""
+NETCONF notifications delivered to the frontend
+File: notifications.py
+
+The notifications received on the subscribed NETCONF sessions are delivered
+via Socket.IO in batches (limited by size and time). A bounded queue is kept
+for each subscription, the oldest notifications are dropped when the frontend
+does not keep up with the device.
+"""
+
+import json
+import logging
+import time
+from collections import deque
+
+import eventlet
+from flask import request
+from liberouterapi import socketio, auth, config
+import yang
+import netconf2 as nc
+
+from .connections import sessions, _session_touch
+from .socketio import sio_clients, sio_on_leave
+
+log = logging.getLogger(__name__)
+
+# maximum number of notifications in a single Socket.IO message
+NOTIF_BATCH_SIZE = int(config['netopeer'].get('notifications_batch_size', '100'))
+# maximum delay (in seconds) of delivering a received notification
+NOTIF_BATCH_INTERVAL = float(config['netopeer'].get('notifications_batch_interval', '0.5'))
+# maximum number of queued notifications of a subscription, the oldest are dropped
+NOTIF_QUEUE_SIZE = int(config['netopeer'].get('notifications_queue_size', '1000'))
+# period (in seconds) of checking the sessions for the received notifications
+NOTIF_POLL_INTERVAL = float(config['netopeer'].get('notifications_poll_interval', '0.1'))
+
+NOTIF_CPBLT = 'urn:ietf:params:netconf:capability:notification:1.0'
+
+# (username, session key): subscription
+subscriptions = {}
+
+
+def _notif_format(notif):
+	# the bindings provide the notification as its event time and content (data tree)
+	eventtime, tree = notif
+	return {'time': eventtime, 'received': time.time(),
+	        'content': json.loads(tree.print_mem(yang.LYD_JSON, yang.LYP_WITHSIBLINGS))}
+
+
+def _notif_flush(key, sub):
+	while sub['queue']:
+		batch = []
+		while sub['queue'] and len(batch) < NOTIF_BATCH_SIZE:
+			batch.append(sub['queue'].popleft())
+		socketio.emit('notifications', {'key': key, 'notifications': batch, 'dropped': sub['dropped']}, room = sub['room'])
+		sub['sent'] += len(batch)
+	sub['flushed'] = time.time()
+
+
+def _notif_reader(username, key, sub):
+	# the green thread receiving the notifications of a single session, it is not
+	# blocking the hub - the session is only checked for already received notifications.
+	# The session is kept open while a client of the subscribing login session displays them.
+	error = 'The session was closed.'
+	while sub['running'] and key in sessions.get(username, {}):
+		sess = sessions[username][key]
+		if sub['room'] in sio_clients.values():
+			_session_touch(sess)
+		try:
+			# do not read more than a batch at once to give chance to other green threads
+			for _ in range(NOTIF_BATCH_SIZE):
+				notif = sess['session'].recvNotif(timeout = 0)
+				if notif is None:
+					break
+				if len(sub['queue']) == NOTIF_QUEUE_SIZE:
+					sub['dropped'] += 1
+				sub['queue'].append(_notif_format(notif))
+				sub['received'] += 1
+		except Exception as e:
+			log.error('Receiving notifications on session ' + key + ' failed: ' + str(e))
+			error = str(e)
+			break
+
+		if len(sub['queue']) >= NOTIF_BATCH_SIZE or \
+				(sub['queue'] and time.time() - sub['flushed'] >= NOTIF_BATCH_INTERVAL):
+			_notif_flush(key, sub)
+			eventlet.sleep(0)
+		else:
+			eventlet.sleep(NOTIF_POLL_INTERVAL)
+
+	_notif_flush(key, sub)
+	if sub['running']:
+		# not stopped by the user, let the client know that no more notifications come
+		socketio.emit('notifications', {'key': key, 'notifications': [], 'dropped': sub['dropped'], 'ended': True,
+		                                'error-msg': error}, room = sub['room'])
+	sub['running'] = False
+	if subscriptions.get((username, key)) is sub:
+		del subscriptions[(username, key)]
+
+
+@sio_on_leave
+def _notif_leave(session_id):
+	# nobody receives the notifications anymore
+	for sub_key in [sub_key for sub_key, sub in subscriptions.items() if sub['room'] == session_id]:
+		subscriptions.pop(sub_key)['running'] = False
+
+
+def _notif_info(key, sub):
+	return {'key': key, 'stream': sub['stream'], 'received': sub['received'], 'sent': sub['sent'],
+	        'dropped': sub['dropped'], 'queued': len(sub['queue'])}
+
+
+@auth.required()
+def notifications_subscribe():
+	session = auth.lookup(request.headers.get('lgui-Authorization', None))
+	user = session['user']
+	req = request.get_json(silent = True) or {}
+
+	if not 'key' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing session key.'}))
+
+	key = req['key']
+	if not key in sessions.get(user.username, {}):
+		return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
+	sess = sessions[user.username][key]
+	_session_touch(sess)
+
+	if (user.username, key) in subscriptions:
+		return(json.dumps({'success': False, 'error-msg': 'The session is already subscribed.'}))
+	if not [cpblt for cpblt in sess['session'].capabilities if cpblt.startswith(NOTIF_CPBLT)]:
+		return(json.dumps({'success': False, 'error-msg': 'The device does not support notifications.'}))
+
+	stream = req.get('stream', 'NETCONF')
+	if 'notifications-stream' in sess:
+		# NETCONF subscription cannot be terminated, so the previous one is just being delivered again
+		if sess['notifications-stream'] != stream:
+			return(json.dumps({'success': False, 'error-msg': 'The session is already subscribed to the stream ' +
+			                                                  sess['notifications-stream'] + '.'}))
+	else:
+		try:
+			sess['session'].rpcSubscribe(stream = stream, filter = req.get('filter'), start = req.get('start'),
+			                             stop = req.get('stop'))
+		except nc.ReplyError as e:
+			reply = {'success': False, 'error': []}
+			for err in e.args[0]:
+				reply['error'].append(json.loads(str(err)))
+			return(json.dumps(reply))
+		except Exception as e:
+			return(json.dumps({'success': False, 'error-msg': str(e)}))
+		sess['notifications-stream'] = stream
+
+	# the notifications are delivered only to the Socket.IO clients of the subscribing login session
+	sub = subscriptions[(user.username, key)] = {'stream': stream, 'queue': deque(maxlen = NOTIF_QUEUE_SIZE),
+	                                             'room': session['session_id'], 'running': True, 'received': 0, 'sent': 0, 'dropped': 0,
+	                                             'flushed': time.time()}
+	eventlet.spawn(_notif_reader, user.username, key, sub)
+
+	return(json.dumps({'success': True}))
+
+
+@auth.required()
+def notifications_unsubscribe():
+	session = auth.lookup(request.headers.get('lgui-Authorization', None))
+	user = session['user']
+	req = request.args.to_dict()
+
+	if not 'key' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing session key.'}))
+	if not (user.username, req['key']) in subscriptions:
+		return(json.dumps({'success': False, 'error-msg': 'The session is not subscribed.'}))
+
+	# NETCONF subscription cannot be terminated, the received notifications are just not delivered anymore
+	subscriptions.pop((user.username, req['key']))['running'] = False
+	return(json.dumps({'success': True}))
+
+
+@auth.required()
+def notifications_list():
+	session = auth.lookup(request.headers.get('lgui-Authorization', None))
+	user = session['user']
+
+	result = [_notif_info(key, sub) for (username, key), sub in subscriptions.items() if username == user.username]
+	return(json.dumps({'success': True, 'subscriptions': result}))
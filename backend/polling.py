@@ -0,0 +1,159 @@
+"""
+Periodic polling of the operational data of the watched paths
+File: polling.py
+
+A single poller runs for each watched subtree (session and path) no matter how
+many watchers share it. The poller gets the subtree periodically and sends
+only the changed leafs via Socket.IO.
+"""
+
+import json
+import logging
+import time
+import uuid
+
+import eventlet
+from eventlet import tpool
+from flask import request
+from liberouterapi import socketio, auth, config
+import yang
+
+from .connections import sessions, _session_touch, _session_drop, _session_filter
+from .metrics import metrics_timer
+from .socketio import sio_on_leave
+
+log = logging.getLogger(__name__)
+
+# the shortest allowed polling interval (in seconds)
+POLLING_INTERVAL_MIN = float(config['netopeer'].get('polling_interval_min', '1'))
+
+# (username, session key, path): poller
+pollers = {}
+# watch id: (username, session key, path)
+watches = {}
+
+
+def _poll_values(data, path):
+	# values of all the leafs (and leaf-lists) in the watched subtrees, indexed by the data path. The data
+	# are searched for the path since they are not filtered when the path cannot be expressed as a filter.
+	values = {}
+	for root in (data.find_path(path).data() if data else []):
+		for node in root.tree_dfs():
+			if node.schema().nodetype() & (yang.LYS_LEAF | yang.LYS_LEAFLIST):
+				values[node.path()] = node.subtype().value_str()
+	return values
+
+
+def _poll_interval(poller):
+	intervals = [watcher['interval'] for watcher in poller['watchers'].values()]
+	return max(POLLING_INTERVAL_MIN, min(intervals)) if intervals else POLLING_INTERVAL_MIN
+
+
+def _poll_emit(poller, params):
+	# only the Socket.IO clients of the watching login sessions receive the values
+	for room in set([watcher['room'] for watcher in poller['watchers'].values()]):
+		socketio.emit('watch', params, room = room)
+
+
+def _poller(username, key, path, poller):
+	# polling is not an activity of the user, so the idle session is still closed by the reaper
+	error = 'The session was closed.'
+	while poller['watchers'] and key in sessions.get(username, {}):
+		sess = sessions[username][key]
+
+		start = time.time()
+		try:
+			# the RPC blocks, so it runs in a native thread to not hold the other green threads
+			with metrics_timer('poll'):
+				values = _poll_values(tpool.execute(sess['session'].rpcGet, _session_filter(sess, path)), path)
+		except ConnectionError as e:
+			log.error('Polling ' + path + ' on session ' + key + ' failed: ' + str(e))
+			error = str(e)
+			_session_drop(username, key)
+			break
+		except Exception as e:
+			# e.g. an error reply, the next poll is tried again
+			log.error('Polling ' + path + ' on session ' + key + ' failed: ' + str(e))
+			_poll_emit(poller, {'key': key, 'path': path, 'error-msg': str(e)})
+			eventlet.sleep(_poll_interval(poller))
+			continue
+
+		changed = {p: v for p, v in values.items() if poller['values'].get(p) != v}
+		removed = [p for p in poller['values'] if not p in values]
+		poller['values'] = values
+		if changed or removed:
+			_poll_emit(poller, {'key': key, 'path': path, 'time': start, 'changed': changed, 'removed': removed})
+
+		eventlet.sleep(max(0, _poll_interval(poller) - (time.time() - start)))
+
+	if pollers.get((username, key, path)) is poller:
+		del pollers[(username, key, path)]
+	if poller['watchers']:
+		# the remaining watchers are not updated anymore
+		_poll_emit(poller, {'key': key, 'path': path, 'error-msg': error, 'stopped': list(poller['watchers'])})
+	for id in list(poller['watchers']):
+		watches.pop(id, None)
+
+
+@sio_on_leave
+def _poll_leave(session_id):
+	# the pollers stop themselves when there is no watcher
+	for poller in list(pollers.values()):
+		for id in [id for id, watcher in poller['watchers'].items() if watcher['room'] == session_id]:
+			del poller['watchers'][id]
+			watches.pop(id, None)
+
+
+@auth.required()
+def watch_add():
+	session = auth.lookup(request.headers.get('lgui-Authorization', None))
+	user = session['user']
+	req = request.get_json(silent = True) or {}
+
+	if not 'key' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing session key.'}))
+	if not 'path' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing path to watch.'}))
+	try:
+		interval = float(req.get('interval', POLLING_INTERVAL_MIN))
+	except (TypeError, ValueError):
+		return(json.dumps({'success': False, 'error-msg': 'Invalid polling interval.'}))
+
+	key = req['key']
+	if not key in sessions.get(user.username, {}):
+		return(json.dumps({'success': False, 'error-msg': 'Invalid session key.'}))
+	_session_touch(sessions[user.username][key])
+
+	id = uuid.uuid4().hex
+	watcher = {'interval': interval, 'room': session['session_id']}
+	poller_key = (user.username, key, req['path'])
+	watches[id] = poller_key
+	if poller_key in pollers:
+		# share the running poller, the new watcher gets the complete current values
+		poller = pollers[poller_key]
+		poller['watchers'][id] = watcher
+		values = poller['values']
+	else:
+		poller = pollers[poller_key] = {'watchers': {id: watcher}, 'values': {}}
+		eventlet.spawn(_poller, user.username, key, req['path'], poller)
+		values = None
+
+	return(json.dumps({'success': True, 'id': id, 'interval': _poll_interval(poller), 'values': values}))
+
+
+@auth.required()
+def watch_rm():
+	session = auth.lookup(request.headers.get('lgui-Authorization', None))
+	user = session['user']
+	req = request.args.to_dict()
+
+	if not 'id' in req:
+		return(json.dumps({'success': False, 'error-msg': 'Missing watch id.'}))
+	if not req['id'] in watches or watches[req['id']][0] != user.username:
+		return(json.dumps({'success': False, 'error-msg': 'Invalid watch id.'}))
+
+	poller_key = watches.pop(req['id'])
+	if poller_key in pollers:
+		# the poller stops itself when there is no watcher
+		pollers[poller_key]['watchers'].pop(req['id'], None)
+	return(json.dumps({'success': True}))
@@ -9,22 +9,33 @@ import os
 import logging
 import errno
 import time
+import hashlib
 from subprocess import check_output
 from shutil import copy
+from collections import OrderedDict
 
-from liberouterapi import socketio, auth
-from flask import request
-from eventlet.timeout import Timeout
+from liberouterapi import socketio, auth, config
+from flask import request, Response
 import yang
 
 from .inventory import INVENTORY, inventory_check
-from .socketio import  sio_send, sio_wait, sio_clean
+from .socketio import sio_request
 from .error import NetopeerException
+from .metrics import metrics_timer
+from .transfer import etag_make, etag_response
 
 log = logging.getLogger(__name__)
 
 __SCHEMAS_EMPTY = '{"timestamp":0, "schemas":{}}'
 
+# maximum number of the parsed modules and rendered tree representations kept for schema_get()
+SCHEMA_MODULES_CACHE_SIZE = int(config['netopeer'].get('schema_modules_cache_size', '8'))
+SCHEMA_RENDER_CACHE_SIZE = int(config['netopeer'].get('schema_render_cache_size', '256'))
+
+# LRU caches of schema_get(), the keys include the schema file's content hash
+__schema_modules = OrderedDict()
+__schema_renders = OrderedDict()
+
 def make_schema_key(module):
 	result = module.name()
 	if module.rev_size():
@@ -34,63 +45,111 @@ def make_schema_key(module):
 
 def getschema(name, revision, submod_name, submod_revision, priv):
 	# ask frontend/user for missing schema
-	params = {'id': priv['session_id'], 'name' : name, 'revision' : revision, 'submod_name' : submod_name, 'submod_revision' : submod_revision}
-	socketio.emit('getschema', params, callback = sio_send)
-	result = (None, None)
-	timeout = Timeout(300)
+	params = {'session': priv['session_id'], 'name' : name, 'revision' : revision, 'submod_name' : submod_name, 'submod_revision' : submod_revision}
+	data = sio_request('getschema', params, 300)
+	if data is None:
+		# no response received within the timeout
+		log.info("socketio: getschema timeout.")
+		return (None, None)
+
 	try:
-		# wait for response from the frontend
-		data = sio_wait(priv['session_id'])
 		if data['filename'].lower()[len(data['filename']) - 5:] == '.yang':
 			format = yang.LYS_IN_YANG
 		elif data['filename'].lower()[len(data['filename']) - 4:] == '.yin':
 			format = yang.LYS_IN_YIN
 		else:
-			return result
+			return (None, None)
 		result = (format, data['data'])
-	except Timeout:
-		# no response received within the timeout
-		log.info("socketio: getschema timeout.")
 	except (KeyError, AttributeError) as e:
 		# invalid response
 		log.error(e)
 		log.error("socketio: invalid getschema_result received.")
-	finally:
-		# we have the response
-		sio_clean(priv['session_id'])
-		timeout.cancel()
+		return (None, None)
 
-		# store the received file
-		try:
-			with open(os.path.join(INVENTORY, priv['user'].username, data['filename']), 'w') as schema_file:
-				schema_file.write(data['data'])
-		except Exception as e:
-			log.error(e)
-			pass
+	# store the received file
+	try:
+		with open(os.path.join(INVENTORY, priv['user'].username, data['filename']), 'w') as schema_file:
+			schema_file.write(data['data'])
+	except Exception as e:
+		log.error(e)
 
 	return result
 
 
-def __schema_parse(path, format, session):
+def __schema_context(path, session):
 	try:
-		ctx = yang.Context(os.path.dirname(path), yang.LY_CTX_PREFER_SEARCHDIRS)
+		ctx = yang.Context(path, yang.LY_CTX_PREFER_SEARCHDIRS)
 		ctx.set_module_imp_clb(getschema, session)
 	except Exception as e:
 		raise NetopeerException(str(e))
+	return ctx
+
+
+def __schema_parse(path, format, session, ctx = None):
+	if not ctx:
+		ctx = __schema_context(os.path.dirname(path), session)
 
 	try:
 		module = ctx.parse_module_path(path, yang.LYS_IN_YANG if format == yang.LYS_IN_UNKNOWN else format)
 	except Exception as e:
-		if format != yang.LYS_IN_UNKOWN:
+		if format != yang.LYS_IN_UNKNOWN:
 			raise NetopeerException(str(e))
 		try:
-			module = ctx.parse_module_path(path, ly_LYS_IN_YIN)
+			module = ctx.parse_module_path(path, yang.LYS_IN_YIN)
 		except Exception as e:
 			raise NetopeerException(str(e))
 
 	return module
 
 
+def __schema_fingerprint(path):
+	stat = os.stat(path)
+	with open(path, 'rb') as schema_file:
+		digest = hashlib.sha1(schema_file.read()).hexdigest()
+	return {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': digest}
+
+
+def __schemas_cache_get(cache, key):
+	try:
+		cache.move_to_end(key)
+		return cache[key]
+	except KeyError:
+		return None
+
+
+def __schemas_cache_put(cache, key, value, size):
+	cache[key] = value
+	while len(cache) > size:
+		cache.popitem(last = False)
+
+
+def __schemas_cache_invalidate(path):
+	for cache in [__schema_modules, __schema_renders]:
+		for key in [key for key in cache if key[0] == path]:
+			del cache[key]
+
+
+def __schema_render(path, key, fingerprint, target):
+	# get JSON representation of the (part of the) module, the module parsed for any previous request is reused
+	render_key = (path, key, fingerprint, target)
+	data = __schemas_cache_get(__schema_renders, render_key)
+	if data is not None:
+		return data
+
+	module_key = (path, key, fingerprint)
+	parsed = __schemas_cache_get(__schema_modules, module_key)
+	if not parsed:
+		with metrics_timer('schema-parse'):
+			ctx = yang.Context(path)
+			parsed = (ctx, ctx.parse_module_path(os.path.join(path, key), yang.LYS_IN_YANG))
+		__schemas_cache_put(__schema_modules, module_key, parsed, SCHEMA_MODULES_CACHE_SIZE)
+
+	with metrics_timer('schema-render'):
+		data = json.dumps(json.loads(parsed[1].print_mem(yang.LYS_OUT_JSON, target, 0)), ensure_ascii = False)
+	__schemas_cache_put(__schema_renders, render_key, data, SCHEMA_RENDER_CACHE_SIZE)
+	return data
+
+
 def __schemas_init(path):
 	schemas = json.loads(__SCHEMAS_EMPTY)
 	try:
@@ -164,11 +223,14 @@ def schemas_update(session):
 
 	# get schemas database
 	schemas = __schemas_inv_load(path)
-
-	# get the previous timestamp
-	timestamp = schemas['timestamp']
-
-	# check the current content of the storage
+	if not 'files' in schemas:
+		schemas['files'] = {}
+	files = schemas['files']
+
+	# check the current content of the storage, compare it with the fingerprints of the already processed files
+	modified = False
+	changed = []
+	present = set()
 	for file in os.listdir(path):
 		if file[-5:] == '.yang':
 			format = yang.LYS_IN_YANG
@@ -177,31 +239,64 @@ def schemas_update(session):
 		else:
 			continue
 
+		present.add(file)
+		schemapath = os.path.join(path, file);
+		stat = os.stat(schemapath)
+		if file in files and files[file]['size'] == stat.st_size and files[file]['mtime'] == stat.st_mtime:
+			continue
+
+		fingerprint = __schema_fingerprint(schemapath)
+		if file in files and files[file]['hash'] == fingerprint['hash']:
+			# touched, but not changed
+			files[file] = fingerprint
+			modified = True
+			continue
+		changed.append((file, format, fingerprint))
+
+	for file in [file for file in files if not file in present]:
+		del files[file]
+		modified = True
+
+	if not changed and not modified:
+		# nothing to do
+		return schemas['schemas']
+
+	# parse all the changed files in a single context
+	ctx = None
+	for file, format, fingerprint in changed:
 		schemapath = os.path.join(path, file);
-		if os.path.getmtime(schemapath) > timestamp:
-			# update the list
+		# update the list
+		try:
+			if not ctx:
+				ctx = __schema_context(path, session)
 			try:
+				module = __schema_parse(schemapath, format, session, ctx)
+			except NetopeerException:
+				# the shared context can be affected by the previously parsed modules, try it separately
 				module = __schema_parse(schemapath, format, session)
-				if module.rev_size():
-					name_norm = module.name() + '@' + module.rev().date() + '.yang'
-					schemas['schemas'][name_norm] = {'name': module.name(), 'revision': module.rev().date()}
-				else:
-					name_norm = module.name() + '.yang'
-					schemas['schemas'][name_norm] = {'name': module.name()}
-				if file != name_norm:
-					try:
-						with open(os.path.join(path, name_norm), 'w') as schema_file:
-							schema_file.write(module.print_mem(yang.LYS_OUT_YANG, 0))
-					except:
-						pass
-
-					try:
-						os.remove(schemapath)
-					except:
-						pass
-			except:
-				os.remove(schemapath)
-				continue
+			if module.rev_size():
+				name_norm = module.name() + '@' + module.rev().date() + '.yang'
+				schemas['schemas'][name_norm] = {'name': module.name(), 'revision': module.rev().date()}
+			else:
+				name_norm = module.name() + '.yang'
+				schemas['schemas'][name_norm] = {'name': module.name()}
+			if file != name_norm:
+				try:
+					with open(os.path.join(path, name_norm), 'w') as schema_file:
+						schema_file.write(module.print_mem(yang.LYS_OUT_YANG, 0))
+					files[name_norm] = __schema_fingerprint(os.path.join(path, name_norm))
+				except:
+					pass
+
+				try:
+					os.remove(schemapath)
+				except:
+					pass
+			else:
+				files[file] = fingerprint
+		except:
+			os.remove(schemapath)
+			continue
 
 	#store the list
 	__schemas_inv_save(path, schemas)
@@ -240,10 +335,20 @@ def schema_get():
 	schemas = __schemas_inv_load(path)
 	if key in schemas['schemas']:
 		try:
+			if 'files' in schemas and key in schemas['files']:
+				fingerprint = schemas['files'][key]['hash']
+			else:
+				fingerprint = __schema_fingerprint(os.path.join(path, key))['hash']
+			# the representation changes only with the schema file, so the client's copy is checked before rendering
+			etag = etag_make(fingerprint, key, req.get('type', 'text'), req.get('path'))
+			not_modified = etag_response(etag)
+			if not_modified:
+				return not_modified
+
 			if (not 'type' in req) or req['type'] == 'text':
 				# default (text) representation
 				with open(os.path.join(path, key), 'r') as schema_file:
-					data = schema_file.read()
+					data = json.dumps(schema_file.read(), ensure_ascii = False)
 			else:
 				if req['type'] == 'tree':
 					# build tree representation for frontend
@@ -264,17 +369,19 @@ def schema_get():
 					return(json.dumps({'success': False, 'error-msg': 'Unsupported schema format ' + req['type']}))
 
 				try:
-					ctx = yang.Context(path)
-					module = ctx.parse_module_path(os.path.join(path, key), yang.LYS_IN_YANG)
-					data = json.loads(module.print_mem(yang.LYS_OUT_JSON, target, 0))
+					data = __schema_render(path, key, fingerprint, target)
 				except Exception as e:
 					return(json.dumps({'success': False, 'error-msg':str(e)}))
 
+			# data are already serialized
 			if 'revision' in schemas['schemas'][key]:
-				return(json.dumps({'success': True, 'data': data, 'name':schemas['schemas'][key]['name'],
-								 'revision':schemas['schemas'][key]['revision']}, ensure_ascii = False))
+				result = json.dumps({'success': True, 'name':schemas['schemas'][key]['name'],
+									 'revision':schemas['schemas'][key]['revision']}, ensure_ascii = False)
 			else:
-				return(json.dumps({'success': True, 'data': data, 'name':schemas['schemas'][key]['name']}, ensure_ascii = False))
+				result = json.dumps({'success': True, 'name':schemas['schemas'][key]['name']}, ensure_ascii = False)
+			response = Response(result[:-1] + ', "data": ' + data + '}')
+			response.set_etag(etag)
+			return response
 		except Exception as e:
 			return(json.dumps({'success': False, 'error-msg':str(e)}));
 	return(json.dumps({'success': False, 'error-msg':'Schema ' + key + ' not found.'}))
@@ -292,6 +399,7 @@ def schemas_add():
 	# store the file
 	path = os.path.join(INVENTORY, user.username, file.filename)
 	file.save(path)
+	__schemas_cache_invalidate(os.path.join(INVENTORY, user.username))
 
 	# parse file
 	try:
@@ -344,6 +452,7 @@ def schemas_rm():
 
 	# update the inventory database
 	__schemas_inv_save(path, schemas)
+	__schemas_cache_invalidate(path)
 
 	# remove the schema file
 	try:
@@ -4,11 +4,21 @@ File: socketio.py
 Author: Radek Krejci <rkrejci@cesnet.cz>
 """
 
+import uuid
+
 from eventlet import event
+from eventlet.timeout import Timeout
+from flask import request
+from flask_socketio import join_room
 
-from liberouterapi import socketio
+from liberouterapi import socketio, auth
 
+# events of the outstanding requests to the frontend, the key is the request's unique id
 sio_data = {}
+# login session ids of the joined Socket.IO clients, the key is the client's sid
+sio_clients = {}
+# functions called with the login session id when its last Socket.IO client disconnects
+sio_leave_callbacks = []
 
 
 def sio_send(data):
@@ -23,13 +33,21 @@ def sio_emit(name, params):
 	socketio.emit(name, params, callback = sio_send)
 
 
-def sio_wait(id):
+def sio_request(name, params, timeout):
+	# emit the request with a unique id and wait for the frontend's answer to it,
+	# so more requests (even of the same user) can be processed in parallel
+	id = uuid.uuid4().hex
 	e = sio_data[id] = event.Event()
-	return e.wait()
-
-
-def sio_clean(id):
-	sio_data.pop(id, None)
+	try:
+		params = dict(params)
+		params['id'] = id
+		sio_emit(name, params)
+		with Timeout(timeout, False):
+			return e.wait()
+		# no response received within the timeout
+		return None
+	finally:
+		sio_data.pop(id, None)
 
 
 @socketio.on('device_auth_password')
@@ -37,3 +55,31 @@ def sio_clean(id):
 @socketio.on('getschema_result')
 def process_answer(data):
 	sio_send(data)
+
+
+def sio_on_leave(callback):
+	sio_leave_callbacks.append(callback)
+	return callback
+
+
+@socketio.on('netopeer_join')
+def process_join(data):
+	# the client joins the room of its login session, the events of the user's
+	# background tasks (notifications, watches) are emitted only to this room
+	try:
+		session = auth.lookup(data.get('session'))
+	except Exception:
+		return
+	if not session:
+		return
+	join_room(session['session_id'])
+	sio_clients[request.sid] = session['session_id']
+
+
+@socketio.on('disconnect')
+def process_disconnect():
+	session_id = sio_clients.pop(request.sid, None)
+	if session_id is None or session_id in sio_clients.values():
+		return
+	for callback in sio_leave_callbacks:
+		callback(session_id)
@@ -0,0 +1,109 @@
+"""
+Compression and conditional requests of the blueprint's responses
+File: transfer.py
+
+The responses are compressed (gzip or brotli, when available) according to
+the client's Accept-Encoding, the streamed responses are compressed on the fly.
+The views may provide ETag of the response before producing it to be able to
+answer If-None-Match with 304 cheaply, other successful GET responses get the
+ETag from their content.
+"""
+
+import hashlib
+import zlib
+
+from flask import request, Response
+from liberouterapi import config
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+# responses smaller than this size (in bytes) are not compressed
+COMPRESSION_MIN_SIZE = int(config['netopeer'].get('compression_min_size', '1024'))
+# compression level (1 - fastest, 9 - best) of gzip, brotli's quality is derived from it
+COMPRESSION_LEVEL = int(config['netopeer'].get('compression_level', '6'))
+
+# the compressed representations have their own (suffixed) entity tags
+__etag_suffixes = {None: '', 'gzip': '-gzip', 'br': '-br'}
+
+
+def etag_make(*parts):
+	return hashlib.sha1('\n'.join([str(part) for part in parts]).encode()).hexdigest()
+
+
+def etag_matches(etag):
+	return any([request.if_none_match.contains(etag + suffix) for suffix in __etag_suffixes.values()])
+
+
+def etag_response(etag):
+	# answer the conditional request when the client's representation is still valid, None otherwise
+	if not etag_matches(etag):
+		return None
+	response = Response(status = 304)
+	response.set_etag(etag + __etag_suffixes[_encoding()])
+	response.vary.add('Accept-Encoding')
+	return response
+
+
+def _encoding():
+	accepted = request.accept_encodings
+	if brotli and accepted['br']:
+		return 'br'
+	if accepted['gzip']:
+		return 'gzip'
+	return None
+
+
+def _compressor(encoding):
+	# compress, flush (what was compressed so far) and finish functions of the encoding
+	if encoding == 'br':
+		compressor = brotli.Compressor(quality = min(11, COMPRESSION_LEVEL + 2))
+		return compressor.process, compressor.flush, compressor.finish
+	# wbits 31 = gzip container
+	compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+	return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _compress_stream(chunks, encoding, flush = False):
+	# with flush, each chunk is delivered as soon as it is produced (e.g. the records of newline delimited JSON)
+	compress, flush_chunk, finish = _compressor(encoding)
+	for chunk in chunks:
+		data = compress(chunk.encode() if isinstance(chunk, str) else chunk)
+		if flush:
+			data += flush_chunk()
+		if data:
+			yield data
+	yield finish()
+
+
+def transfer_response(response):
+	# the after_request hook of the blueprint
+	if response.status_code != 200:
+		return response
+
+	if request.method == 'GET' and not response.is_streamed and not response.get_etag()[0]:
+		etag = etag_make(response.get_data())
+		if etag_matches(etag):
+			return etag_response(etag)
+		response.set_etag(etag)
+
+	response.vary.add('Accept-Encoding')
+	encoding = _encoding()
+	if not encoding or 'Content-Encoding' in response.headers:
+		return response
+	if not response.is_streamed and (response.content_length or 0) < COMPRESSION_MIN_SIZE:
+		return response
+
+	etag = response.get_etag()[0]
+	if etag:
+		response.set_etag(etag + __etag_suffixes[encoding])
+	if response.is_streamed:
+		response.response = _compress_stream(response.response, encoding, response.mimetype == 'application/x-ndjson')
+		response.headers.pop('Content-Length', None)
+	else:
+		compress, _, finish = _compressor(encoding)
+		response.set_data(compress(response.get_data()) + finish())
+	response.headers['Content-Encoding'] = encoding
+	return response
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the Netopeer2 GUI backend hot paths
+File: backend.py
+
+Starts the NETCONF server stand-in (see netconf_server.py) with a synthetic
+datastore of the requested size and drives the running backend over its REST
+API:
+- schemas_add (uploading the synthetic module),
+- connect (including schemas_update) and session_close,
+- session_get of the complete data (recursive) and of a subtree, both with
+  the device asked every time (refresh) and served from the cache,
+- session_commit of a single leaf change,
+- schema_get of the module's tree.
+For each of them, the throughput and latency percentiles are reported. The
+internal stages of the backend (e.g. schemas_update performed by each connect,
+the RPCs to the device) are reported from the backend's metrics, which needs
+the token of an administrator (unless the metrics are public). With --pid of
+the backend process, its peak RSS is reported as well.
+
+The backend (liberouter GUI with the netopeer module) is expected to be running,
+the token of a logged in user is used for the requests:
+    $ python3 benchmarks/backend.py --url http://localhost:5555 --token <token> \\
+          --fanout 100 --depth 2 --leaves 8 --pid $(pgrep -f liberouterapi)
+Instead of the stand-in, an external NETCONF server can be used (--device),
+but then the datastore content is up to the server.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import uuid
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from netconf_server import NetconfStandIn, BENCH_REVISION
+
+
+class Backend:
+	def __init__(self, url, token):
+		self.url = url.rstrip('/') + '/netopeer'
+		self.token = token
+
+	def request(self, method, path, params = None, body = None, files = None):
+		url = self.url + path
+		if params:
+			url += '?' + urllib.parse.urlencode(params)
+		headers = {'lgui-Authorization': self.token, 'Authorization': self.token}
+		data = None
+		if files:
+			boundary = uuid.uuid4().hex
+			data = b''
+			for name, (filename, content) in files.items():
+				data += ('--' + boundary + '\r\nContent-Disposition: form-data; name="' + name + '"; filename="' +
+				         filename + '"\r\nContent-Type: application/octet-stream\r\n\r\n').encode() + content + b'\r\n'
+			data += ('--' + boundary + '--\r\n').encode()
+			headers['Content-Type'] = 'multipart/form-data; boundary=' + boundary
+		elif body is not None:
+			data = json.dumps(body).encode()
+			headers['Content-Type'] = 'application/json'
+
+		req = urllib.request.Request(url, data = data, headers = headers, method = method)
+		with urllib.request.urlopen(req) as resp:
+			content = resp.read()
+		return content
+
+
+def percentile(values, p):
+	values = sorted(values)
+	index = min(len(values) - 1, max(0, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+	return values[index]
+
+
+def peak_rss(pid):
+	# VmHWM is the peak resident set size of the process
+	try:
+		with open('/proc/' + str(pid) + '/status') as status:
+			for line in status:
+				if line.startswith('VmHWM:'):
+					return int(line.split()[1]) * 1024
+	except (OSError, ValueError):
+		pass
+	return None
+
+
+def measure(name, iterations, func, results):
+	latencies = []
+	size = 0
+	start = time.perf_counter()
+	for _ in range(iterations):
+		op_start = time.perf_counter()
+		content = func()
+		latencies.append(time.perf_counter() - op_start)
+		size += len(content) if content else 0
+	elapsed = time.perf_counter() - start
+	results.append({'name': name, 'count': iterations, 'throughput': iterations / elapsed,
+	                'p50': percentile(latencies, 50), 'p90': percentile(latencies, 90),
+	                'p99': percentile(latencies, 99), 'max': max(latencies), 'bytes': size / iterations})
+
+
+def stages(backend):
+	# the backend's stage histograms: {stage: (bucket bounds, cumulative counts, sum, count)}, None if not available
+	try:
+		text = backend.request('GET', '/metrics').decode()
+	except urllib.error.HTTPError:
+		return None
+	result = {}
+	for name, labels, value in re.findall(r'^netopeer_stage_seconds_(bucket|sum|count)\{([^}]*)\} (\S+)$', text, re.M):
+		labels = dict(re.findall(r'(\w+)="([^"]*)"', labels))
+		stage = result.setdefault(labels['stage'], {'buckets': [], 'sum': 0.0, 'count': 0})
+		if name == 'bucket':
+			stage['buckets'].append((float(labels['le']), int(value)))
+		else:
+			stage[name] = float(value)
+	return result
+
+
+def stages_report(before, after):
+	# the stages observed during the benchmark, the percentiles are the upper bounds of the histogram buckets
+	print('%-30s %6s %10s %10s %10s %10s' % ('backend stage', 'count', 'mean [ms]', 'p50 [ms]', 'p90 [ms]', 'p99 [ms]'))
+	for stage in sorted(after):
+		previous = before.get(stage, {'buckets': [], 'sum': 0.0, 'count': 0})
+		count = int(after[stage]['count'] - previous['count'])
+		if not count:
+			continue
+		buckets = [(bound, value - dict(previous['buckets']).get(bound, 0)) for bound, value in after[stage]['buckets']]
+
+		def bound(p):
+			for le, value in buckets:
+				if value >= p / 100.0 * count:
+					return le * 1000
+			return float('inf')
+
+		print('%-30s %6d %10.2f %10.2f %10.2f %10.2f' % (stage, count, (after[stage]['sum'] - previous['sum']) * 1000 / count,
+		                                                bound(50), bound(90), bound(99)))
+
+
+def check(content):
+	# the backend reports errors in the replies, not by the HTTP status
+	reply = json.loads(content)
+	if isinstance(reply, dict) and reply.get('success') is False:
+		raise RuntimeError(reply.get('error-msg') or json.dumps(reply.get('error')))
+	return reply
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Benchmark of the Netopeer2 GUI backend.')
+	parser.add_argument('--url', default = 'http://localhost:5555', help = 'URL of the liberouter GUI API')
+	parser.add_argument('--token', required = True, help = 'authorization token of a logged in GUI user')
+	parser.add_argument('--pid', type = int, help = 'PID of the backend process to report its peak RSS')
+	parser.add_argument('--device', help = 'host:port of an external NETCONF server to use instead of the stand-in')
+	parser.add_argument('--username', default = 'bench', help = 'NETCONF (SSH) username')
+	parser.add_argument('--password', default = 'bench', help = 'NETCONF (SSH) password')
+	parser.add_argument('--fingerprint', help = 'host key fingerprint of the external NETCONF server')
+	parser.add_argument('--fanout', type = int, default = 10, help = 'number of instances of each list')
+	parser.add_argument('--depth', type = int, default = 2, help = 'number of nested lists')
+	parser.add_argument('--leaves', type = int, default = 4, help = 'number of non-key leafs in each list')
+	parser.add_argument('--iterations', type = int, default = 20, help = 'number of repetitions of each operation')
+	args = parser.parse_args()
+
+	backend = Backend(args.url, args.token)
+	results = []
+	stages_before = stages(backend)
+	device = {'username': args.username, 'password': args.password}
+	if args.device:
+		device['hostname'], device['port'] = args.device.rsplit(':', 1)
+		device['port'] = int(device['port'])
+		if args.fingerprint:
+			device['fingerprint'] = args.fingerprint
+	else:
+		server = NetconfStandIn(0, args.username, args.password, args.fanout, args.depth, args.leaves).start()
+		device.update({'hostname': '127.0.0.1', 'port': server.port, 'fingerprint': server.fingerprint})
+		print('NETCONF stand-in on port %d with datastore of %d bytes' % (server.port, len(server.data)))
+
+		# make the module available in the user's inventory
+		module = ('bench@' + BENCH_REVISION + '.yang', server.module.encode())
+		measure('schemas_add', 1, lambda: backend.request('POST', '/inventory/schemas', files = {'schema': module}), results)
+
+	def connect():
+		reply = check(backend.request('POST', '/session', body = {'device': device}))
+		return reply['session-key']
+
+	def connect_close():
+		key = connect()
+		backend.request('DELETE', '/session', params = {'key': key})
+		return b''
+
+	measure('connect+close', args.iterations, connect_close, results)
+	key = connect()
+
+	full = {'key': key, 'recursive': 'true'}
+	subtree = {'key': key, 'recursive': 'true', 'path': '/bench:top/level1[name=\'n0\']'}
+	measure('session_get (device)', args.iterations,
+	        lambda: backend.request('GET', '/session/rpcGet', params = dict(full, refresh = 'true')), results)
+	measure('session_get (cached)', args.iterations,
+	        lambda: backend.request('GET', '/session/rpcGet', params = full), results)
+	if not args.device:
+		measure('session_get subtree (device)', args.iterations,
+		        lambda: backend.request('GET', '/session/rpcGet', params = dict(subtree, refresh = 'true')), results)
+		measure('session_get subtree (cached)', args.iterations,
+		        lambda: backend.request('GET', '/session/rpcGet', params = subtree), results)
+
+		counter = iter(range(sys.maxsize))
+		def commit():
+			mods = {'/bench:top/level1[name=\'n0\']/value0': {'type': 'change', 'value': 'bench' + str(next(counter))}}
+			content = backend.request('POST', '/session/commit', body = {'key': key, 'modifications': mods})
+			check(content)
+			return content
+		if args.leaves:
+			measure('session_commit', args.iterations, commit, results)
+
+		measure('schema_get (tree)', args.iterations,
+		        lambda: backend.request('GET', '/inventory/schema', params = {'key': 'bench@' + BENCH_REVISION + '.yang',
+		                                                                        'type': 'tree'}), results)
+
+	backend.request('DELETE', '/session', params = {'key': key})
+
+	print('%-30s %6s %10s %10s %10s %10s %10s %12s' % ('operation', 'count', 'ops/s', 'p50 [ms]', 'p90 [ms]',
+	                                                  'p99 [ms]', 'max [ms]', 'bytes/op'))
+	for r in results:
+		print('%-30s %6d %10.1f %10.2f %10.2f %10.2f %10.2f %12d' % (r['name'], r['count'], r['throughput'],
+		      r['p50'] * 1000, r['p90'] * 1000, r['p99'] * 1000, r['max'] * 1000, r['bytes']))
+	stages_after = stages(backend) if stages_before is not None else None
+	if stages_after is not None:
+		print()
+		stages_report(stages_before, stages_after)
+	else:
+		print('backend stages: the metrics are not accessible with the token')
+	if args.pid:
+		rss = peak_rss(args.pid)
+		print('backend peak RSS: ' + ('%.1f MiB' % (rss / 1048576.0) if rss else 'unknown'))
+
+
+if __name__ == '__main__':
+	main()
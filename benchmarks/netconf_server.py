@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Minimal NETCONF server stand-in for the backend benchmarks
+File: netconf_server.py
+
+Serves a synthetic datastore of the generated "bench" module over SSH
+(NETCONF 1.0 and 1.1 framing) on localhost. It is not a NETCONF server,
+it implements just enough to be a counterpart of libnetconf2 client:
+- <get> and <get-config> reply the datastore selected by the filter - subtree
+  filters (containment, selection and content match nodes) and XPath filters
+  of the data paths (/top/level1[name='n0']/... with key predicates only),
+- <edit-config> is acknowledged but not applied,
+- <get-schema> provides the generated module,
+- <close-session>,
+other operations are replied with the operation-not-supported error.
+
+It requires paramiko. Run it standalone to benchmark the GUI manually:
+    $ python3 benchmarks/netconf_server.py --port 8300 --fanout 100 --depth 2
+"""
+
+import argparse
+import copy
+import hashlib
+import re
+import socket
+import threading
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+try:
+	import paramiko
+except ImportError:
+	paramiko = None
+
+NS_BASE = 'urn:ietf:params:xml:ns:netconf:base:1.0'
+NS_MONITORING = 'urn:ietf:params:xml:ns:yang:ietf-netconf-monitoring'
+NS_BENCH = 'urn:cesnet:netopeer2gui:bench'
+BENCH_REVISION = '2024-01-01'
+
+ET.register_namespace('', NS_BENCH)
+
+CAPABILITIES = [
+	'urn:ietf:params:netconf:base:1.0',
+	'urn:ietf:params:netconf:base:1.1',
+	'urn:ietf:params:netconf:capability:writable-running:1.0',
+	'urn:ietf:params:netconf:capability:xpath:1.0',
+	NS_MONITORING + '?module=ietf-netconf-monitoring&revision=2010-10-04',
+	NS_BENCH + '?module=bench&revision=' + BENCH_REVISION,
+]
+
+
+def bench_module(depth, leaves):
+	# YANG module with nested lists, each list has a key and the given number of other leafs
+	lines = ['module bench {', '  namespace "' + NS_BENCH + '";', '  prefix b;',
+	         '  revision ' + BENCH_REVISION + ';', '  container top {']
+	indent = '    '
+	for level in range(1, depth + 1):
+		lines.append(indent + 'list level' + str(level) + ' {')
+		lines.append(indent + '  key "name";')
+		lines.append(indent + '  leaf name { type string; }')
+		for leaf in range(leaves):
+			lines.append(indent + '  leaf value' + str(leaf) + ' { type string; }')
+		indent += '  '
+	for level in range(depth, 0, -1):
+		indent = indent[:-2]
+		lines.append(indent + '}')
+	lines.extend(['  }', '}', ''])
+	return '\n'.join(lines)
+
+
+def bench_data(fanout, depth, leaves):
+	# XML of the datastore content, fanout instances of each list in each of its parents
+	def level(number, prefix):
+		result = []
+		for i in range(fanout):
+			name = prefix + str(i)
+			result.append('<level' + str(number) + '><name>' + name + '</name>')
+			for leaf in range(leaves):
+				result.append('<value' + str(leaf) + '>' + name + '-' + str(leaf) + '</value' + str(leaf) + '>')
+			if number < depth:
+				result.append(level(number + 1, name + '.'))
+			result.append('</level' + str(number) + '>')
+		return ''.join(result)
+
+	return '<top xmlns="' + NS_BENCH + '">' + (level(1, 'n') if depth else '') + '</top>'
+
+
+def _local(tag):
+	return tag.split('}')[-1]
+
+
+def subtree_filter(node, fnode):
+	# RFC 6241 subtree filtering of the node, None if the node is not selected
+	fchildren = list(fnode)
+	text = (fnode.text or '').strip()
+	if not fchildren:
+		if text and (node.text or '').strip() != text:
+			return None
+		return copy.deepcopy(node)
+	# all the content match nodes must match
+	matches = [fchild for fchild in fchildren if not len(fchild) and (fchild.text or '').strip()]
+	for fchild in matches:
+		if not [child for child in node if _local(child.tag) == _local(fchild.tag) and
+		        (child.text or '').strip() == fchild.text.strip()]:
+			return None
+	if len(matches) == len(fchildren):
+		# only the content match nodes select the complete node
+		return copy.deepcopy(node)
+	result = ET.Element(node.tag, node.attrib)
+	for fchild in fchildren:
+		for child in node:
+			if _local(child.tag) == _local(fchild.tag):
+				selected = subtree_filter(child, fchild)
+				if selected is not None:
+					result.append(selected)
+	return result
+
+
+def xpath_filter(root, select):
+	# XPath of a data path (absolute location path with key predicates only), ValueError for other expressions.
+	# Returns the selected nodes with their ancestors (and the keys of the ancestor list instances).
+	steps = []
+	matches = list(re.finditer(r'/([\w.:-]+)((?:\[[^\]]*\])*)', select))
+	if not matches or ''.join([match.group(0) for match in matches]) != select:
+		raise ValueError('Unsupported XPath ' + select)
+	for match in matches:
+		predicates = re.findall(r"\[\s*([\w.:-]+)\s*=\s*(?:'([^']*)'|\"([^\"]*)\")\s*\]", match.group(2))
+		if len(predicates) != match.group(2).count('['):
+			raise ValueError('Unsupported predicate in XPath ' + select)
+		steps.append((match.group(1).split(':')[-1],
+		              [(name.split(':')[-1], single or double) for name, single, double in predicates]))
+
+	# the selected nodes with their ancestors (and the keys of the ancestor list instances)
+	def select_step(node, index):
+		name, predicates = steps[index]
+		if _local(node.tag) != name:
+			return None
+		for key, value in predicates:
+			if not [child for child in node if _local(child.tag) == key and (child.text or '').strip() == value]:
+				return None
+		if index == len(steps) - 1:
+			return copy.deepcopy(node)
+		result = ET.Element(node.tag, node.attrib)
+		for child in node:
+			if [key for key, _ in predicates if _local(child.tag) == key]:
+				result.append(copy.deepcopy(child))
+		selected = [select_step(child, index + 1) for child in node]
+		selected = [child for child in selected if child is not None]
+		if not selected:
+			return None
+		result.extend(selected)
+		return result
+
+	return select_step(root, 0)
+
+
+def host_key_fingerprint(key):
+	# the format used by libnetconf2 for the host key check callback
+	digest = hashlib.sha1(key.asbytes()).hexdigest()
+	return ':'.join([digest[i:i + 2] for i in range(0, len(digest), 2)])
+
+
+class Framing:
+	# NETCONF message framing, end-of-message delimiter until both sides support base:1.1
+	def __init__(self, channel):
+		self.channel = channel
+		self.buffer = b''
+		self.chunked = False
+
+	def send(self, message):
+		data = message.encode()
+		if self.chunked:
+			self.channel.sendall(b'\n#' + str(len(data)).encode() + b'\n' + data + b'\n##\n')
+		else:
+			self.channel.sendall(data + b']]>]]>')
+
+	def __read(self, size = 65536):
+		data = self.channel.recv(size)
+		if not data:
+			raise EOFError()
+		self.buffer += data
+
+	def recv(self):
+		if not self.chunked:
+			while b']]>]]>' not in self.buffer:
+				self.__read()
+			message, self.buffer = self.buffer.split(b']]>]]>', 1)
+			return message.decode()
+
+		message = b''
+		while True:
+			while b'\n' not in self.buffer[1:]:
+				self.__read()
+			header, self.buffer = self.buffer[1:].split(b'\n', 1)
+			if header == b'##':
+				return message.decode()
+			size = int(header[1:])
+			while len(self.buffer) < size:
+				self.__read()
+			message += self.buffer[:size]
+			self.buffer = self.buffer[size:]
+
+
+class Server(paramiko.ServerInterface if paramiko else object):
+	def __init__(self, username, password, module, data):
+		self.username = username
+		self.password = password
+		self.module = module
+		self.data = data
+		self.tree = ET.fromstring(data)
+		self.event = threading.Event()
+
+	def check_channel_request(self, kind, chanid):
+		if kind == 'session':
+			return paramiko.OPEN_SUCCEEDED
+		return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+	def get_allowed_auths(self, username):
+		return 'password'
+
+	def check_auth_password(self, username, password):
+		if username == self.username and password == self.password:
+			return paramiko.AUTH_SUCCESSFUL
+		return paramiko.AUTH_FAILED
+
+	def check_channel_subsystem_request(self, channel, name):
+		if name != 'netconf':
+			return False
+		self.event.set()
+		return True
+
+	def reply(self, rpc, content):
+		attrs = ''.join([' %s="%s"' % (name, escape(value)) for name, value in rpc.attrib.items()])
+		return '<rpc-reply xmlns="' + NS_BASE + '"' + attrs + '>' + content + '</rpc-reply>'
+
+	def select(self, operation):
+		# the datastore content selected by the filter of <get>/<get-config>, None for an unsupported filter
+		filter = operation.find('{' + NS_BASE + '}filter')
+		if filter is None:
+			return self.data
+		if filter.get('type', filter.get('{' + NS_BASE + '}type', 'subtree')) == 'xpath':
+			try:
+				selected = xpath_filter(self.tree, filter.get('select', filter.get('{' + NS_BASE + '}select', '')))
+			except ValueError:
+				return None
+		else:
+			selected = None
+			for fnode in filter:
+				if _local(fnode.tag) == _local(self.tree.tag):
+					selected = subtree_filter(self.tree, fnode)
+		return ET.tostring(selected, encoding = 'unicode') if selected is not None else ''
+
+	def serve(self, channel, session_id):
+		framing = Framing(channel)
+		framing.send('<hello xmlns="' + NS_BASE + '"><capabilities>' +
+		             ''.join(['<capability>' + escape(c) + '</capability>' for c in CAPABILITIES]) +
+		             '</capabilities><session-id>' + str(session_id) + '</session-id></hello>')
+		hello = ET.fromstring(framing.recv())
+		framing.chunked = 'urn:ietf:params:netconf:base:1.1' in [c.text.strip() for c in hello.iter('{' + NS_BASE + '}capability')]
+
+		while True:
+			rpc = ET.fromstring(framing.recv())
+			operation = rpc[0].tag.split('}')[-1] if len(rpc) else None
+			if operation in ['get', 'get-config']:
+				data = self.select(rpc[0])
+				if data is None:
+					framing.send(self.reply(rpc, '<rpc-error><error-type>application</error-type>'
+					                             '<error-tag>operation-not-supported</error-tag>'
+					                             '<error-severity>error</error-severity>'
+					                             '<error-message>Unsupported filter.</error-message></rpc-error>'))
+				else:
+					framing.send(self.reply(rpc, '<data>' + data + '</data>'))
+			elif operation in ['edit-config', 'commit', 'discard-changes', 'lock', 'unlock']:
+				framing.send(self.reply(rpc, '<ok/>'))
+			elif operation == 'get-schema':
+				identifier = rpc[0].find('{' + NS_MONITORING + '}identifier')
+				if identifier is not None and identifier.text == 'bench':
+					framing.send(self.reply(rpc, '<data xmlns="' + NS_MONITORING + '">' + escape(self.module) + '</data>'))
+				else:
+					framing.send(self.reply(rpc, '<rpc-error><error-type>application</error-type>'
+					                             '<error-tag>invalid-value</error-tag><error-severity>error</error-severity>'
+					                             '</rpc-error>'))
+			elif operation == 'close-session':
+				framing.send(self.reply(rpc, '<ok/>'))
+				return
+			else:
+				framing.send(self.reply(rpc, '<rpc-error><error-type>protocol</error-type>'
+				                             '<error-tag>operation-not-supported</error-tag>'
+				                             '<error-severity>error</error-severity></rpc-error>'))
+
+
+class NetconfStandIn:
+	def __init__(self, port = 0, username = 'bench', password = 'bench', fanout = 10, depth = 2, leaves = 4):
+		if not paramiko:
+			raise RuntimeError('The NETCONF server stand-in requires paramiko.')
+		self.username = username
+		self.password = password
+		self.module = bench_module(depth, leaves)
+		self.data = bench_data(fanout, depth, leaves)
+		self.host_key = paramiko.RSAKey.generate(2048)
+		self.fingerprint = host_key_fingerprint(self.host_key)
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.sock.bind(('127.0.0.1', port))
+		self.port = self.sock.getsockname()[1]
+		self.sessions = 0
+
+	def start(self):
+		self.sock.listen(128)
+		thread = threading.Thread(target = self.__accept, daemon = True)
+		thread.start()
+		return self
+
+	def __accept(self):
+		while True:
+			client, _ = self.sock.accept()
+			self.sessions += 1
+			threading.Thread(target = self.__session, args = (client, self.sessions), daemon = True).start()
+
+	def __session(self, client, session_id):
+		transport = paramiko.Transport(client)
+		transport.add_server_key(self.host_key)
+		server = Server(self.username, self.password, self.module, self.data)
+		try:
+			transport.start_server(server = server)
+			channel = transport.accept(30)
+			if channel and server.event.wait(30):
+				server.serve(channel, session_id)
+		except (EOFError, paramiko.SSHException, socket.error):
+			pass
+		finally:
+			transport.close()
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'NETCONF server stand-in with a synthetic datastore.')
+	parser.add_argument('--port', type = int, default = 8300, help = 'port to listen on (localhost only)')
+	parser.add_argument('--username', default = 'bench', help = 'SSH username')
+	parser.add_argument('--password', default = 'bench', help = 'SSH password')
+	parser.add_argument('--fanout', type = int, default = 10, help = 'number of instances of each list')
+	parser.add_argument('--depth', type = int, default = 2, help = 'number of nested lists')
+	parser.add_argument('--leaves', type = int, default = 4, help = 'number of non-key leafs in each list')
+	args = parser.parse_args()
+
+	server = NetconfStandIn(args.port, args.username, args.password, args.fanout, args.depth, args.leaves).start()
+	print('listening on 127.0.0.1:%d, host key fingerprint %s' % (server.port, server.fingerprint))
+	print('datastore of %d bytes' % len(server.data))
+	threading.Event().wait()
+
+
+if __name__ == '__main__':
+	main()
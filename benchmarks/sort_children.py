@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark of grouping list and leaf-list instances when serializing data
+File: sort_children.py
+
+Measures _sortChildren() on the sibling sets of growing size where the list
+and leaf-list instances are interleaved with each other, which is the worst
+case for grouping them. The time per child is supposed to stay constant.
+
+Run it in the environment of the backend (libyang bindings and liberouterapi
+available), e.g.:
+    $ python3 benchmarks/sort_children.py --max 102400
+"""
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+try:
+	from liberouterapi.modules.netopeer.data import _sortChildren
+except ImportError:
+	sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+	from backend.data import _sortChildren
+
+import yang
+
+
+def siblings(count):
+	# 4 lists and a leaf-list interleaved, separated by some leafs
+	result = []
+	for i in range(count):
+		if i % 10 == 0:
+			info = {'type': yang.LYS_LEAF, 'module': 'bench', 'name': 'leaf' + str(i)}
+		elif i % 5 == 0:
+			info = {'type': yang.LYS_LEAFLIST, 'module': 'bench', 'name': 'leaflist', 'ordered': True}
+		else:
+			info = {'type': yang.LYS_LIST, 'module': 'bench', 'name': 'list' + str(i % 4), 'ordered': True}
+		result.append({'info': info, 'path': '/bench:top/node' + str(i)})
+	return result
+
+
+def measure(count, repeat):
+	data = siblings(count)
+	best = None
+	for _ in range(repeat):
+		node = {'children': copy.copy(data)}
+		start = time.perf_counter()
+		_sortChildren(node)
+		elapsed = time.perf_counter() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Benchmark of _sortChildren() scaling.')
+	parser.add_argument('--min', type = int, default = 100, help = 'the smallest number of siblings')
+	parser.add_argument('--max', type = int, default = 102400, help = 'the largest number of siblings')
+	parser.add_argument('--repeat', type = int, default = 5, help = 'number of runs, the best one is reported')
+	args = parser.parse_args()
+
+	print('%10s %12s %14s' % ('siblings', 'time [ms]', 'per child [us]'))
+	count = args.min
+	while count <= args.max:
+		elapsed = measure(count, args.repeat)
+		print('%10d %12.3f %14.3f' % (count, elapsed * 1000, elapsed * 1000000 / count))
+		count *= 2
+
+
+if __name__ == '__main__':
+	main()
@@ -1,4 +1,4 @@
-import {Component, OnInit} from '@angular/core';
+import {Component, OnInit, OnDestroy} from '@angular/core';
 import { Router } from '@angular/router';
 import { Observable } from 'rxjs/Observable';
 
@@ -7,6 +7,8 @@ import {ModificationsService} from './modifications.service';
 import {SessionsService} from './sessions.service';
 import {Session} from './session';
 
+import {SocketService} from 'app/services/socket.service';
+
 @Component({
     selector: 'netopeer-config',
     templateUrl: './config.component.html',
@@ -14,15 +16,20 @@ import {Session} from './session';
     providers: [ModificationsService]
 })
 
-export class ConfigComponent implements OnInit {
+export class ConfigComponent implements OnInit, OnDestroy {
     title = 'Configuration';
     activeSession: Session;
     err_msg = "";
     commit_error = [];
+    /** Identifiers of the backend's watches of the active session's subtrees. */
+    watches: string[] = [];
+    /** Polling interval (in seconds) of the live update. */
+    watchInterval = 5;
 
     constructor(public sessionsService: SessionsService,
                 public modsService: ModificationsService,
                 public treeService: TreeService,
+                private socketService: SocketService,
                 private router: Router) {}
 
     addSession() {
@@ -33,14 +40,14 @@ export class ConfigComponent implements OnInit {
         switch (this.activeSession.dataPresence) {
         case 'root':
             this.activeSession.data = null;
-            this.sessionsService.rpcGet(this.activeSession, false);
+            this.sessionsService.rpcGet(this.activeSession, false, true);
             break;
         case 'all':
             this.activeSession.data = null;
-            this.sessionsService.rpcGet(this.activeSession, true);
+            this.sessionsService.rpcGet(this.activeSession, true, true);
             break;
         case 'mixed':
-            this.sessionsService.rpcGetSubtree(this.activeSession.key, false).subscribe(result => {
+            this.sessionsService.rpcGetSubtree(this.activeSession.key, false, "", true).subscribe(result => {
                 let root = this.activeSession.data;
                 if (result['success']) {
                     for (let newRoot of result['data']) {
@@ -113,6 +120,10 @@ export class ConfigComponent implements OnInit {
     invertStatus() {
         this.activeSession.statusVisibility = !this.activeSession.statusVisibility;
         this.sessionsService.storeSessions();
+        if (this.activeSession.statusVisibility) {
+            /* only the configuration was retrieved while the status data were hidden */
+            this.reloadData();
+        }
     }
 
     getCapabilities(key: string) {
@@ -207,7 +218,62 @@ export class ConfigComponent implements OnInit {
         });
     }
 
+    /**
+     * Watch the currently loaded top-level subtrees, the values of the loaded
+     * leafs are then updated by the backend's polling.
+     */
+    startWatching() {
+        for (let root of this.activeSession.data['children']) {
+            this.sessionsService.watch(this.activeSession.key, root['path'], this.watchInterval).subscribe(result => {
+                if (result['success']) {
+                    this.watches.push(result['id']);
+                    if (result['values']) {
+                        this.updateValues(this.activeSession.data, result['values']);
+                    }
+                } else {
+                    this.err_msg = result['error-msg'];
+                }
+            });
+        }
+    }
+
+    stopWatching() {
+        for (let id of this.watches) {
+            this.sessionsService.unwatch(id).subscribe();
+        }
+        this.watches = [];
+    }
+
+    private updateValues(node, values: object) {
+        if ((node['info'] && node['info']['type'] == 4) && (node['path'] in values)) {
+            node['value'] = values[node['path']];
+        }
+        if (node['children']) {
+            for (let child of node['children']) {
+                this.updateValues(child, values);
+            }
+        }
+    }
+
+    ngOnDestroy(): void {
+        this.stopWatching();
+        this.socketService.unsubscribe('watch');
+    }
+
     ngOnInit(): void {
+        this.socketService.send('netopeer_join', this.sessionsService.socketJoinData());
+        this.socketService.subscribe('watch').subscribe((message: any) => {
+            if (message['stopped']) {
+                /* the backend does not poll these watches anymore */
+                let stopped = this.watches.filter(id => message['stopped'].indexOf(id) != -1);
+                if (stopped.length) {
+                    this.watches = this.watches.filter(id => message['stopped'].indexOf(id) == -1);
+                    this.err_msg = message['error-msg'];
+                }
+            } else if (this.activeSession && message['key'] == this.activeSession.key && message['changed']) {
+                this.updateValues(this.activeSession.data, message['changed']);
+            }
+        });
         this.sessionsService.checkSessions();
         this.activeSession = this.sessionsService.getSession();
         if (this.activeSession && !this.activeSession.data) {
@@ -20,6 +20,10 @@ export class SessionsService {
     public sessions: Session[];
     /** Identifier of the currently active session. */
     public activeSession: string;
+    /** Maximal number of list's instances loaded from backend at once. */
+    public instancesLimit: number = 100;
+    /** Value checks waiting to be sent to the backend in a single request. */
+    private pendingChecks = [];
 
     /**
      * Initiate internal data.
@@ -256,6 +260,46 @@ export class SessionsService {
         }
     }
 
+    /**
+     * Load next instances of the list which were not provided by backend
+     * (because of the instancesLimit) with the rest of the data.
+     * @param activeSession Session to work with.
+     * @param node The first instance of the list.
+     */
+    loadInstances(activeSession: Session, node: Node): void {
+        if (node['loading'] || !this.treeService.moreInstances(activeSession, node)) {
+            return;
+        }
+        let parent = this.treeService.nodeParent(activeSession, node);
+        let instances = this.treeService.getInstances(activeSession, node).filter(item => !('new' in item));
+        let lastInstance = instances[instances.length - 1];
+
+        node['loading'] = true;
+        this.rpcGetSubtree(activeSession.key, true, parent['path'] == '/' ? "" : parent['path'], false,
+                           node['info']['path'], node['offset'] + instances.length).subscribe(result => {
+            delete node['loading'];
+            if (!result['success']) {
+                return;
+            }
+            let loaded = (parent['path'] == '/') ? result['data'] : result['data']['children'];
+            for (let item of loaded) {
+                delete item['offset'];
+                delete item['total'];
+                this.treeService.setDirty(activeSession, item);
+            }
+            if (loaded.length && !lastInstance['last']) {
+                delete loaded[loaded.length - 1]['last'];
+            } else if (loaded.length) {
+                delete lastInstance['last'];
+            }
+            /* keep the instances together, right after the last loaded instance */
+            let index = parent['children'].indexOf(lastInstance);
+            parent['children'].splice(index + 1, 0, ...loaded);
+            this.treeService.updateHiddenFlags(activeSession);
+            this.storeSessions();
+        });
+    }
+
     /**
      * Backend request to check validity of the value for the specified node.
      *
@@ -280,6 +324,69 @@ export class SessionsService {
             );
     }
 
+    /**
+     * Backend request to check validity of multiple values at once.
+     *
+     * Accesses backend REST API POST:/netopeer/session/checkvalues
+     *
+     * @param sessionKey Session identifier.
+     * @param items List of the values to check, each item is an object with
+     *        path (schema or data path), value and schema (true for the schema
+     *        path, false for the path of an existing data node) members.
+     * @returns Observable of the response, its data member is the list of
+     *          results in the order of the items
+     */
+    checkValues(sessionKey: string, items: object[]): Observable<object> {
+        return this.http.post<object>('/netopeer/session/checkvalues', { 'key': sessionKey, 'items': items })
+            .pipe(
+                catchError(err => Observable.throw(err))
+            );
+    }
+
+    /**
+     * Check validity of the value for the specified node. The checks requested
+     * at once (e.g. of all the fields of a new list instance being rendered)
+     * are sent to the backend in a single checkValues() request.
+     *
+     * @param sessionKey Session identifier.
+     * @param path Schema path of the node to check
+     * @param value Value of the node to be checked
+     * @returns Observable of the check's result with the success member
+     */
+    checkValueBatched(sessionKey: string, path: string, value: string): Observable<object> {
+        return new Observable<object>(observer => {
+            if (!this.pendingChecks.length) {
+                setTimeout(() => this.checkValuesPending(), 0);
+            }
+            this.pendingChecks.push({'key': sessionKey, 'item': {'path': path, 'value': value, 'schema': true},
+                                     'observer': observer});
+        });
+    }
+
+    /**
+     * Send the pending value checks, a single request for each session.
+     */
+    private checkValuesPending(): void {
+        let checks = this.pendingChecks;
+        this.pendingChecks = [];
+        let keys = checks.map(check => check['key']).filter((key, index, all) => all.indexOf(key) == index);
+        for (let key of keys) {
+            let session = checks.filter(check => check['key'] == key);
+            this.checkValues(key, session.map(check => check['item'])).subscribe(result => {
+                session.forEach((check, index) => {
+                    if (result['success']) {
+                        check['observer'].next(result['data'][index]);
+                    } else {
+                        check['observer'].next(result);
+                    }
+                    check['observer'].complete();
+                });
+            }, err => {
+                session.forEach(check => check['observer'].error(err));
+            });
+        }
+    }
+
     /**
      * Filter given schemas list by the information about the node's children.
      * Only the schemas which can be instantiated as child of node are kept
@@ -409,28 +516,50 @@ export class SessionsService {
     }
 
     /**
-     * Backend request to get running data.
+     * Backend request to get running data. When the session's status data
+     * are hidden, only the configuration of the running datastore is requested
+     * (without the state data and default values).
      *
      * Accesses backend REST API GET:/netopeer/session/rpcGet
      *
      * @param sessionKey Session identifier.
      * @param all Flag to get whole subtree or only one level of children
      * @param path Optional path to get the selected subtree of data.
+     * @param refresh Flag to bypass the data cached by backend and get them from the device.
+     * @param list Optional schema path of the list to get only its instances.
+     * @param offset Number of the list's instances to skip.
      * @returns Observable
      */
-    rpcGetSubtree(sessionKey: string, all: boolean, path: string = ""): Observable<object> { // <string[]>
+    rpcGetSubtree(sessionKey: string, all: boolean, path: string = "", refresh: boolean = false,
+                  list: string = "", offset: number = 0): Observable<object> { // <string[]>
         let params = new HttpParams()
                         .set('key', sessionKey)
-                        .set('recursive', all.toString());
+                        .set('recursive', all.toString())
+                        .set('limit', this.instancesLimit.toString())
+                        .set('format', 'compact');
         if (path !== "") {
             params = params.append('path', path);
         }
+        if (refresh) {
+            params = params.append('refresh', 'true');
+        }
+        if (list !== "") {
+            params = params.append('list', list).append('offset', offset.toString());
+        }
+        let session = this.sessions.find(session => session.key == sessionKey);
+        if (session && !session.statusVisibility) {
+            params = params.append('datastore', 'running');
+        }
 
         return this.http.get<object>('/netopeer/session/rpcGet', { params: params })
             .pipe(
                 map( (response: object) => {
                     if( !response['success'] ) {
                         this.checkSession( sessionKey );
+                    } else if ('schemas' in response) {
+                        /* compact format - nodes refer to the schema information by index */
+                        this.expandSchemas(response['data'], response['schemas']);
+                        delete response['schemas'];
                     }
                     return response;
                 }),
@@ -438,6 +567,27 @@ export class SessionsService {
             );
     }
 
+    /**
+     * Replace the indexes of the schema information in the nodes received in
+     * the compact format by the information itself. The information objects
+     * are shared by all the nodes of the same schema node.
+     *
+     * @param data Node or list of nodes to expand including their children.
+     * @param schemas List of the schema information referred by the nodes.
+     */
+    private expandSchemas(data, schemas: NodeSchema[]): void {
+        let nodes = Array.isArray(data) ? data.slice() : [data];
+        while (nodes.length) {
+            let node = nodes.pop();
+            if (typeof node['info'] == 'number') {
+                node['info'] = schemas[node['info']];
+            }
+            if (node['children']) {
+                nodes.push(...node['children']);
+            }
+        }
+    }
+
     /**
      * Backend request to get complete running data. The returned data are
      * connected with the provided session.
@@ -446,11 +596,12 @@ export class SessionsService {
      *
      * @param session Session to work with.
      * @param all Flag to get whole subtree or only one level of children
+     * @param refresh Flag to bypass the data cached by backend and get them from the device.
      */
-    rpcGet(session: Session, all: boolean): void {
+    rpcGet(session: Session, all: boolean, refresh: boolean = false): void {
         session.loading = true;
         delete session.data;
-        this.rpcGetSubtree( session.key, all ).subscribe( result => {
+        this.rpcGetSubtree( session.key, all, "", refresh ).subscribe( result => {
             if ( result['success'] ) {
                 for ( let iter of result['data'] ) {
                     this.treeService.setDirty( session, iter );
@@ -547,4 +698,130 @@ export class SessionsService {
                 catchError((err: any) => Observable.throw(err))
             );
     }
+
+    /**
+     * Data of socket.io's netopeer_join event. The client joins the room of
+     * its login session, the notifications and the watched values are
+     * delivered only to the clients of the subscribing login session.
+     *
+     * @returns Data to send with the netopeer_join event
+     */
+    socketJoinData(): object {
+        let login = JSON.parse(localStorage.getItem('session'));
+        return {'session': login ? login['session_id'] : null};
+    }
+
+    /**
+     * Backend request to subscribe for the device's notifications. The received
+     * notifications are delivered in batches via socket.io's notifications event.
+     *
+     * Accesses backend REST API POST:/netopeer/session/notifications
+     *
+     * @param sessionKey Session identifier.
+     * @param stream Name of the notifications stream.
+     * @returns Observable of the response
+     */
+    subscribeNotifications(sessionKey: string, stream: string = 'NETCONF'): Observable<object> {
+        return this.http.post<object>('/netopeer/session/notifications', {'key': sessionKey, 'stream': stream})
+            .pipe(
+                catchError(err => Observable.throw(err))
+            );
+    }
+
+    /**
+     * Backend request to stop delivering the device's notifications.
+     *
+     * Accesses backend REST API DELETE:/netopeer/session/notifications
+     *
+     * @param sessionKey Session identifier.
+     * @returns Observable of the response
+     */
+    unsubscribeNotifications(sessionKey: string): Observable<object> {
+        let params = new HttpParams()
+            .set('key', sessionKey);
+        return this.http.delete<object>('/netopeer/session/notifications', { params: params })
+            .pipe(
+                catchError(err => Observable.throw(err))
+            );
+    }
+
+    /**
+     * Backend request for the notification subscriptions of the user's sessions.
+     *
+     * Accesses backend REST API GET:/netopeer/session/notifications
+     *
+     * @returns Observable of the response
+     */
+    notificationSubscriptions(): Observable<object> {
+        return this.http.get<object>('/netopeer/session/notifications')
+            .pipe(
+                catchError(err => Observable.throw(err))
+            );
+    }
+
+    /**
+     * Backend request to poll the subtree periodically. The changed values are
+     * delivered via socket.io's watch event.
+     *
+     * Accesses backend REST API POST:/netopeer/session/watch
+     *
+     * @param sessionKey Session identifier.
+     * @param path Data path of the watched subtree.
+     * @param interval Polling interval in seconds.
+     * @returns Observable of the response with the watch id
+     */
+    watch(sessionKey: string, path: string, interval: number): Observable<object> {
+        return this.http.post<object>('/netopeer/session/watch', {'key': sessionKey, 'path': path, 'interval': interval})
+            .pipe(
+                catchError(err => Observable.throw(err))
+            );
+    }
+
+    /**
+     * Backend request to stop watching the subtree.
+     *
+     * Accesses backend REST API DELETE:/netopeer/session/watch
+     *
+     * @param id Watch identifier received from watch().
+     * @returns Observable of the response
+     */
+    unwatch(id: string): Observable<object> {
+        let params = new HttpParams()
+            .set('id', id);
+        return this.http.delete<object>('/netopeer/session/watch', { params: params })
+            .pipe(
+                catchError(err => Observable.throw(err))
+            );
+    }
+
+    /**
+     * Backend request to create NETCONF sessions to the specified devices at
+     * once. Internally handles maintenance of the sessions list. The progress
+     * of connecting each device is reported by backend via socket.io's
+     * connect_progress events.
+     *
+     * Accesses backend REST API POST:/netopeer/session/bulk
+     *
+     * @param devs Stored NETCONF devices to connect to.
+     */
+    connectBulk(devs: Device[]) {
+        return this.http.post('/netopeer/session/bulk', {'ids': devs.map(dev => dev.id)})
+            .pipe(
+                tap(resp => {
+                    if (resp['success']) {
+                        for (let result of resp['sessions']) {
+                            if (result['success']) {
+                                this.sessions.push(new Session(result['session-key'], devs.find(dev => dev.id == result['device'])));
+                            }
+                        }
+                        if (!this.activeSession && this.sessions.length) {
+                            this.activeSession = this.sessions[this.sessions.length - 1].key;
+                            localStorage.setItem('activeSession', this.activeSession);
+                        }
+                        this.storeSessions();
+                    }
+                }),
+                catchError((err: any) => Observable.throw(err))
+            );
+    }
 }
@@ -1,4 +1,4 @@
-import {Component, Directive, ElementRef, EventEmitter, Input, Output, OnInit, ChangeDetectorRef} from '@angular/core';
+import {Component, Directive, ElementRef, EventEmitter, HostListener, Input, Output, OnInit, ChangeDetectorRef} from '@angular/core';
 import {Router} from '@angular/router';
 
 import {Session} from './session';
@@ -23,6 +23,29 @@ export class TreeScrollTo {
     }
 }
 
+@Directive({
+    selector: '[loadOnScroll]'
+})
+export class LoadOnScroll {
+    @Output() onLoad = new EventEmitter();
+    private fired = false;
+
+    constructor(private elRef:ElementRef) {}
+
+    ngAfterContentInit() {
+        this.check();
+    }
+
+    @HostListener('window:scroll')
+    check() {
+        /* emit the event (only once) when the element gets into the view */
+        if (!this.fired && this.elRef.nativeElement.getBoundingClientRect().top < window.innerHeight) {
+            this.fired = true;
+            this.onLoad.emit();
+        }
+    }
+}
+
 @Directive({
     selector: '[checkLeafValue]'
 })
@@ -129,7 +152,7 @@ export class TreeEdit {
         } else {
             path = node['info']['path'];
         }
-        this.sessionsService.checkValue(this.activeSession.key, path, target.value).subscribe(result => {
+        this.sessionsService.checkValueBatched(this.activeSession.key, path, target.value).subscribe(result => {
             if (result['success']) {
                 target.classList.remove("invalid");
                 confirm.style.visibility = "visible";
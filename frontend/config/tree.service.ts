@@ -274,6 +274,25 @@ export class TreeService {
         return result;
     }
 
+    /**
+     * Get number of the list's instances which were not yet loaded from backend.
+     * @param activeSession Session to work with.
+     * @param node The first instance of the list as provided by backend.
+     * @returns Number of the missing instances.
+     */
+    moreInstances(activeSession, node): number {
+        if (!('total' in node)) {
+            return 0;
+        }
+        let loaded = 0;
+        for (let item of this.getInstances(activeSession, node)) {
+            if (!('new' in item)) {
+                loaded++;
+            }
+        }
+        return node['total'] - node['offset'] - loaded;
+    }
+
     nodesToShow(activeSession, node) {
         let result = [];
         if (node['info']['type'] == 16) {
@@ -37,6 +37,8 @@ export class InventoryDevicesComponent implements OnInit {
     namePlaceholder: string = "";
     id: number;
     err_msg = "";
+    /* number of the connects in progress, they share the socket.io subscriptions */
+    connecting = 0;
 
     constructor(
         private devicesService: DevicesService,
@@ -141,6 +143,29 @@ export class InventoryDevicesComponent implements OnInit {
             device.name = device.hostname + ":" + device.port;
         }
 
+        if (!this.connecting++) {
+            this.subscribeCallbacks();
+        }
+        this.sessionsService.connect(device).subscribe(result => {
+            if (result['success']) {
+                this.router.navigateByUrl('/netopeer/config');
+            } else {
+                this.err_msg = result['error-msg']
+            }
+            if (!--this.connecting) {
+                this.socketService.unsubscribe('hostcheck');
+                this.socketService.unsubscribe('device_auth');
+                this.socketService.unsubscribe('getschema');
+            }
+        });
+    }
+
+    /**
+     * Answer the backend's requests during connecting the devices. Each request
+     * carries its unique id, so the answers are matched to the requests even
+     * when more devices are being connected in parallel.
+     */
+    subscribeCallbacks() {
         this.socketService.subscribe('hostcheck').subscribe((message: any) => {
             switch(message['state']) {
             case ssh_hostcheck_status.SSH_SERVER_KNOWN_CHANGED:
@@ -178,17 +203,6 @@ export class InventoryDevicesComponent implements OnInit {
                 this.socketAnswer('getschema_result', message['id'], 'filename', '', 'data', '');
             });
         });
-
-        this.sessionsService.connect(device).subscribe(result => {
-            if (result['success']) {
-                this.router.navigateByUrl('/netopeer/config');
-            } else {
-                this.err_msg = result['error-msg']
-            }
-            this.socketService.unsubscribe('hostcheck');
-            this.socketService.unsubscribe('device_auth');
-            this.socketService.unsubscribe('getschema');
-        });
     }
 
     ngOnInit(): void {
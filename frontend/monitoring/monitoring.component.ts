@@ -1,4 +1,17 @@
-import { Component } from '@angular/core';
+import { Component, OnInit, OnDestroy } from '@angular/core';
+
+import { SessionsService } from '../config/sessions.service';
+import { Session } from '../config/session';
+
+import { SocketService } from 'app/services/socket.service';
+
+/** Notification as delivered from the backend. */
+export class Notification {
+  key: string;
+  time: string;
+  received: number;
+  content: any;
+}
 
 @Component({
   selector : 'netopeer-config',
@@ -6,6 +19,90 @@ import { Component } from '@angular/core';
   styleUrls : ['./monitoring.component.scss']
 })
 
-export class MonitoringComponent {
+export class MonitoringComponent implements OnInit, OnDestroy {
   title = 'Monitoring';
+  /** Maximal number of the displayed notifications, the oldest are removed. */
+  maxNotifications = 1000;
+  /** Received notifications, the newest first. */
+  notifications: Notification[] = [];
+  /** Subscriptions of the sessions, indexed by the session key. */
+  subscriptions = {};
+  /** Streams to subscribe, indexed by the session key. */
+  streams = {};
+  /** Number of the notifications dropped by the backend, indexed by the session key. */
+  dropped = {};
+  err_msg = "";
+
+  constructor(public sessionsService: SessionsService,
+              private socketService: SocketService) { }
+
+  ngOnInit() {
+    this.socketService.send('netopeer_join', this.sessionsService.socketJoinData());
+    this.sessionsService.notificationSubscriptions().subscribe(result => {
+      if (result['success']) {
+        for (let sub of result['subscriptions']) {
+          this.subscriptions[sub['key']] = sub;
+        }
+      }
+    });
+
+    this.socketService.subscribe('notifications').subscribe((message: any) => {
+      if (!(message['key'] in this.subscriptions)) {
+        /* not our session */
+        return;
+      }
+      this.dropped[message['key']] = message['dropped'];
+      if (message['ended']) {
+        /* the backend stopped receiving, e.g. the session was closed */
+        delete this.subscriptions[message['key']];
+        this.err_msg = this.deviceName(message['key']) + ': ' + message['error-msg'];
+        return;
+      }
+      /* whole batch is added at once to update the view only once */
+      let batch = message['notifications'].map(notif => Object.assign({'key': message['key']}, notif)).reverse();
+      this.notifications = batch.concat(this.notifications).slice(0, this.maxNotifications);
+    });
+  }
+
+  ngOnDestroy() {
+    /* nobody displays the notifications anymore, do not keep the sessions busy */
+    for (let key in this.subscriptions) {
+      this.sessionsService.unsubscribeNotifications(key).subscribe();
+    }
+    this.subscriptions = {};
+    this.socketService.unsubscribe('notifications');
+  }
+
+  deviceName(key: string): string {
+    let session = this.sessionsService.sessions.find(session => session.key == key);
+    return session ? session.device.name : key;
+  }
+
+  subscribe(session: Session) {
+    let stream = this.streams[session.key];
+    this.sessionsService.subscribeNotifications(session.key, stream || 'NETCONF').subscribe(result => {
+      if (result['success']) {
+        this.subscriptions[session.key] = {'key': session.key, 'stream': stream || 'NETCONF'};
+      } else {
+        this.err_msg = result['error-msg'] || 'Subscription failed.';
+      }
+    });
+  }
+
+  unsubscribe(session: Session) {
+    this.sessionsService.unsubscribeNotifications(session.key).subscribe(result => {
+      delete this.subscriptions[session.key];
+      if (!result['success']) {
+        this.err_msg = result['error-msg'];
+      }
+    });
+  }
+
+  clear() {
+    this.notifications = [];
+  }
+
+  content(notif: Notification): string {
+    return typeof notif.content == 'string' ? notif.content : JSON.stringify(notif.content);
+  }
 }
@@ -1,5 +1,7 @@
 import { Component, OnInit } from '@angular/core';
 
+import { SocketService } from 'app/services/socket.service';
+
 import { SessionsService } from './config/sessions.service';
 import { DevicesService } from './inventory/devices.service';
 import { Device } from './inventory/device';
@@ -26,11 +28,16 @@ const NCOMPONENTS: NComponent[] = [
 export class NetopeerComponent implements OnInit {
   componentTitle = '';
   netopeerComponents = NCOMPONENTS;
+  /** Progress of connecting the autoconnect devices, the device's state is indexed by its id. */
+  connectProgress = null;
 
   constructor(private sessionsService: SessionsService,
-              private devicesService: DevicesService) { }
+              private devicesService: DevicesService,
+              private socketService: SocketService) { }
 
   ngOnInit() {
+      /* the connect progress is delivered only to the clients in the room of the login session */
+      this.socketService.send('netopeer_join', this.sessionsService.socketJoinData());
       /* autoconnect selected devices if needed */
       if (localStorage.getItem('netopeer-autoconnect') == 'enabled') {
           let ac_sessions: number[] = []; /* currently connected autoconnect devices' ids */
@@ -53,14 +60,40 @@ export class NetopeerComponent implements OnInit {
                   /* we have not connected autoconnect device */
                   ac_devices.push(device);
               }
-              for (let device of ac_devices) {
-                  this.sessionsService.connect(device).subscribe();
+              if (ac_devices.length) {
+                  this.connectDevices(ac_devices);
               }
               localStorage.setItem('netopeer-autoconnect', 'done');
           });
       }
   }
 
+  /**
+   * Connect the devices at once, the progress of each device is reported by
+   * the backend via socket.io's connect_progress events.
+   */
+  connectDevices(devices: Device[]) {
+    let login = this.sessionsService.socketJoinData()['session'];
+    this.connectProgress = {'total': devices.length, 'devices': {}};
+    this.socketService.subscribe('connect_progress').subscribe((message: any) => {
+      if (message['session'] != login || !this.connectProgress) {
+        /* not our connect */
+        return;
+      }
+      this.connectProgress['devices'][message['device']] = message['state'];
+    });
+    let done = () => {
+      this.socketService.unsubscribe('connect_progress');
+      this.connectProgress = null;
+    };
+    this.sessionsService.connectBulk(devices).subscribe(done, done);
+  }
+
+  connectCount(state: string): number {
+    let devices = this.connectProgress['devices'];
+    return Object.keys(devices).filter(id => devices[id] == state).length;
+  }
+
   onActivate(componentRef) {
     this.componentTitle = componentRef.title;
   }
@@ -21,7 +21,7 @@ import { InventoryComponent, DialogueSchema } from './inventory/inventory.compon
 import { InventorySchemasComponent } from './inventory/schemas.component';
 import { InventoryDevicesComponent, DialogueHostcheck, DialoguePassword } from './inventory/devices.component';
 import { ConfigComponent } from './config/config.component';
-import { TreeView, TreeNode, TreeLeaflistValue, TreeIndent, TreeCreate, TreeEdit, TreeScrollTo, CheckLeafValue } from './config/tree.component';
+import { TreeView, TreeNode, TreeLeaflistValue, TreeIndent, TreeCreate, TreeEdit, TreeScrollTo, CheckLeafValue, LoadOnScroll } from './config/tree.component';
 import { YANGComponent, YANGModule, YANGIdentity, YANGFeature, YANGTypedef, YANGType, YANGRestriction, YANGNode, YANGIffeature } from './yang/yang.component';
 import { MonitoringComponent } from './monitoring/monitoring.component';
 import { PluginsComponent } from './plugins/plugins.component';
@@ -107,6 +107,7 @@ const routes: Routes = [
     OrderingDirective,
     CheckLeafValue,
     TreeScrollTo,
+    LoadOnScroll,
     TreeIndent,
     TreeEdit,
     TreeCreate,